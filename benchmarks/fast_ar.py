@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import warnings
+
+# Fast AR engine vs statsmodels ARIMA on the synthetic provider (no network).
+# For each ticker, runs the prediction page's pipeline (7-day rolling mean, differencing order by ADF,
+# standard scaling), holds out the last 30 bars, fits both engines on the rest and scores their
+# 30-step forecasts in price units. ARIMA fits bypass the model cache, so every fit is timed cold.
+#
+#   python benchmarks/fast_ar.py --tickers 8
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['STOCK_DATA_DIR'] = tempfile.mkdtemp(prefix='fast-ar-bench-')
+
+import numpy as np  # noqa: E402
+from statsmodels.tsa.arima.model import ARIMA  # noqa: E402
+from pages.utils.backtest import forecast_errors  # noqa: E402
+from pages.utils.model import fast_ar_forecast, get_data, get_differencing_order, get_rolling_mean, scaling  # noqa: E402
+from pages.utils.providers import SyntheticProvider, set_provider  # noqa: E402
+
+HORIZON = 30
+# Upper bounds; see benchmarks/README.md
+TARGETS = {
+    'fast_fit_ms': 10.0,
+    # mean RMSE of the fast engine relative to ARIMA's
+    'fast_rmse_ratio': 1.25,
+}
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - t0) * 1000
+
+
+def run(ticker):
+    rolling = get_rolling_mean(get_data(ticker))
+    d = get_differencing_order(rolling)
+    train, actual = rolling.iloc[:-HORIZON], rolling.to_numpy()[-HORIZON:]
+    scaled, scaler = scaling(train)
+    last = train.iloc[-1]
+
+    rows = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        results, ms = _timed(lambda: ARIMA(scaled, order=(30, d, 1)).fit())
+    rows['arima'] = (results.get_forecast(steps=HORIZON).predicted_mean, ms)
+    for method in ('ls', 'yw'):
+        fast_ar_forecast(scaled, d, method=method)
+        # best of a few runs: a single sub-millisecond fit is mostly timer noise
+        rows[f'fast_{method}'] = min((_timed(fast_ar_forecast, scaled, d, method=method) for _ in range(5)),
+                                     key=lambda r: r[1])
+
+    scores = {}
+    for engine, (forecast, ms) in rows.items():
+        forecast = scaler.inverse_transform(np.asarray(forecast).reshape(-1, 1))[:, 0]
+        scores[engine] = (ms, *forecast_errors(actual, forecast, last))
+    return d, scores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', type=int, default=8)
+    parser.add_argument('--years', type=int, default=3)
+    args = parser.parse_args()
+    set_provider(SyntheticProvider(length=252 * args.years))
+
+    totals = {}
+    print(f"{'ticker':>7} {'d':>2} {'engine':>8} {'fit ms':>9} {'rmse':>8} {'mape %':>7} {'dir %':>6}")
+    for i in range(args.tickers):
+        ticker = f'S{i:04d}'
+        d, scores = run(ticker)
+        for engine, (ms, rmse, mape, direction) in scores.items():
+            print(f'{ticker:>7} {d:>2} {engine:>8} {ms:>9.2f} {rmse:>8.3f} {mape:>7.2f} {direction:>6.1f}')
+            totals.setdefault(engine, []).append((ms, rmse, mape, direction))
+
+    print()
+    print(f"{'engine':>8} {'median ms':>10} {'rmse':>8} {'mape %':>7} {'dir %':>6}")
+    summary = {}
+    for engine, values in totals.items():
+        values = np.array(values)
+        summary[engine] = (np.median(values[:, 0]), *values[:, 1:].mean(axis=0))
+        print(f'{engine:>8} {summary[engine][0]:>10.2f} {summary[engine][1]:>8.3f} {summary[engine][2]:>7.2f}'
+              f' {summary[engine][3]:>6.1f}')
+
+    measured = {
+        'fast_fit_ms': max(summary['fast_ls'][0], summary['fast_yw'][0]),
+        'fast_rmse_ratio': min(summary['fast_ls'][1], summary['fast_yw'][1]) / summary['arima'][1],
+    }
+    failed = False
+    for key, limit in TARGETS.items():
+        if measured[key] > limit:
+            print(f'  over target: {key} = {measured[key]:.2f} > {limit:.2f}')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+
+# Universe-scale CAPM benchmark on the synthetic provider (no network).
+# Loads an N-name universe through the local store twice (cold: empty store, warm: already synced),
+# then runs universe_capm on the aligned panel, and checks each measurement against TARGETS.
+#
+#   python benchmarks/universe_capm.py --names 500 1000 3000 --years 10
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ['STOCK_DATA_DIR'] = tempfile.mkdtemp(prefix='capm-bench-')
+
+from pages.utils.providers import SyntheticProvider, set_provider  # noqa: E402
+from pages.utils.universe import load_universe_panel, universe_capm  # noqa: E402
+
+# Upper bounds per 1000 names on ten years of daily bars (single core); see benchmarks/README.md
+TARGETS = {
+    'cold_load_s': 25.0,
+    'warm_load_s': 8.0,
+    'capm_s': 0.25,
+    'capm_peak_mb': 75.0,
+}
+
+
+def run(names, years):
+    set_provider(SyntheticProvider(length=252 * years))
+    tickers = [f'S{i:04d}' for i in range(names)]
+
+    t0 = time.perf_counter()
+    load_universe_panel(tickers)
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    # rebuild the panel from the synced store rather than returning the cached one
+    panel, skipped = load_universe_panel(tickers, max_age=datetime.timedelta(0))
+    warm = time.perf_counter() - t0
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    stats = universe_capm(panel)
+    capm = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+
+    assert not skipped and stats['beta'].notna().all()
+    return {
+        'names': names, 'days': len(panel), 'panel_mb': panel.values.nbytes / 2 ** 20,
+        'cold_load_s': cold, 'warm_load_s': warm, 'capm_s': capm, 'capm_peak_mb': peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--names', type=int, nargs='+', default=[500, 1000, 3000])
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'names':>6} {'days':>6} {'panel MB':>9} {'cold s':>8} {'warm s':>8} {'capm s':>8} {'peak MB':>8}")
+    for names in args.names:
+        r = run(names, args.years)
+        print(f"{r['names']:>6} {r['days']:>6} {r['panel_mb']:>9.1f} {r['cold_load_s']:>8.2f} {r['warm_load_s']:>8.2f}"
+              f" {r['capm_s']:>8.3f} {r['capm_peak_mb']:>8.1f}")
+        scale = names / 1000 * args.years / 10
+        for key, limit in TARGETS.items():
+            if r[key] > limit * max(scale, 1):
+                print(f'  over target: {key} = {r[key]:.2f} > {limit * max(scale, 1):.2f}')
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
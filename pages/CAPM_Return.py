@@ -1,9 +1,10 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 import datetime
-import pandas_datareader as web
 import pages.utils.capm_functions as capm_functions
+import pages.utils.portfolio as portfolio
+from pages.utils.panel import get_price_panel
+from pages.utils.universe import UNIVERSE_FILE, load_constituents, load_universe_panel, market_return, universe_capm
 
 st.set_page_config(
   page_title="CAPM",
@@ -91,16 +92,31 @@ st.markdown("""
 st.markdown('<div class="input-section">', unsafe_allow_html=True)
 st.markdown("### 🎯 **Portfolio Configuration**")
 
+mode = st.radio(
+    "Analysis mode",
+    ('Selected stocks', 'Index universe'),
+    horizontal=True,
+    help="Index universe runs CAPM on every constituent listed in a local file"
+)
+
 col1,col2=st.columns(2)
 
 with col1:
-    st.markdown("#### 📊 **Select Stocks for Analysis**")
-    stocks_list =st.multiselect(
-        "Choose up to 4 stocks",
-        ('TSLA','AAPL','NFLX','MSFT','MGM','AMZN','NVDA','GOOGL'),
-        default=['TSLA','AAPL','NFLX','MSFT'],
-        help="Select 2-4 stocks for comprehensive CAPM analysis"
-    )
+    if mode == 'Index universe':
+        st.markdown("#### 🌐 **Index Constituents**")
+        universe_file = st.text_input(
+            "Constituent list file",
+            value=UNIVERSE_FILE,
+            help="Local CSV with a Symbol column, or one symbol per line"
+        )
+    else:
+        st.markdown("#### 📊 **Select Stocks for Analysis**")
+        stocks_list =st.multiselect(
+            "Choose up to 4 stocks",
+            ('TSLA','AAPL','NFLX','MSFT','MGM','AMZN','NVDA','GOOGL'),
+            default=['TSLA','AAPL','NFLX','MSFT'],
+            help="Select 2-4 stocks for comprehensive CAPM analysis"
+        )
 with col2:
     st.markdown("#### ⏱️ **Analysis Time Period**")
     years=st.number_input(
@@ -145,28 +161,74 @@ st.markdown("""
 # Data processing section
 st.markdown("### 📊 **Data Processing & Analysis**")
 
+if mode == 'Index universe':
+    try:
+      constituents = load_constituents(universe_file)
+    except (OSError, ValueError) as e:
+      st.error(f"❌ Could not read the constituent list: {e}")
+      st.stop()
+
+    with st.spinner(f'🔄 Loading {len(constituents)} constituents and calculating metrics...'):
+      today = datetime.date.today()
+      start = datetime.date(today.year - years, today.month, today.day)
+      try:
+        universe_df, skipped = load_universe_panel(constituents, start, benchmark='sp500')
+      except Exception as e:
+        st.error(f"❌ Error fetching market data: {e}")
+        st.stop()
+      results = universe_capm(universe_df).dropna(subset=['beta'])
+
+    if skipped:
+      st.warning(f"⚠️ No data for {len(skipped)} symbols: {', '.join(skipped[:20])}{' ...' if len(skipped) > 20 else ''}")
+
+    st.markdown('<div class="results-section">', unsafe_allow_html=True)
+    st.markdown("### 🎯 **Universe CAPM Results**")
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Stocks analysed", f"{len(results)}")
+    col2.metric("Median beta", f"{results['beta'].median():.2f}")
+    col3.metric("Market return (annual)", f"{market_return(universe_df):.2f}%")
+    col4.metric("Trading days", f"{len(universe_df)}")
+
+    table = results.reset_index().rename(columns={
+        'beta': 'Beta', 'alpha': 'Alpha (daily %)', 'r2': 'R²', 'expected_return': 'Expected Return (%)',
+        'annual_return': 'Annual Return (%)', 'annual_volatility': 'Volatility (%)', 'observations': 'Observations',
+    })[['Stock', 'Beta', 'Expected Return (%)', 'Annual Return (%)', 'Volatility (%)', 'Alpha (daily %)', 'R²', 'Observations']]
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+      sort_by = st.selectbox("Sort by", table.columns, index=1)
+    with col2:
+      descending = st.toggle("Descending", value=True)
+    with col3:
+      page_size = st.selectbox("Rows per page", (25, 50, 100, 250), index=1)
+    pages = max(1, -(-len(table) // page_size))
+    with col4:
+      page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+
+    # sort the whole universe, then show one page of it
+    table = table.sort_values(sort_by, ascending=not descending, kind='stable', na_position='last')
+    st.dataframe(
+        table.iloc[(page - 1) * page_size:page * page_size].round(4),
+        use_container_width=True,
+        hide_index=True,
+    )
+    st.caption(f"Page {page} of {pages} · {len(table)} stocks")
+    st.download_button("⬇️ Download all results (CSV)", table.to_csv(index=False), file_name="universe_capm.csv", mime="text/csv")
+
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.stop()
+
 with st.spinner('🔄 Fetching market data and calculating metrics...'):
     # downloading data 
     today = datetime.date.today()
     start = datetime.date(today.year - years, today.month, today.day)
     end = today
-    stocks_df = pd.DataFrame()
-    sp500 = pd.DataFrame()
-
     try:
-      sp500 = web.DataReader(['sp500'],'fred', start, end)
+      stocks_df = get_price_panel(stocks_list, start, benchmark='sp500')
     except Exception as e:
-      st.error(f"❌ Error fetching S&P 500 data: {e}")
-
-    for stock in stocks_list:
-      data = yf.download(stock, period=f"{years}y")
-      stocks_df[f'{stock}']=data['Close']
-
-    stocks_df.reset_index(inplace=True)
-    sp500.reset_index(inplace=True)
-    sp500.rename(columns={'DATE':'Date'},inplace=True)
-
-    stocks_df = pd.merge(stocks_df, sp500, how='inner', on='Date')
+      st.error(f"❌ Error fetching market data: {e}")
+      st.stop()
 
 # Data display section
 st.markdown('<div class="data-container">', unsafe_allow_html=True)
@@ -198,14 +260,9 @@ with col2:
 # Calculate metrics
 stocks_daily_return = capm_functions.daily_returns(stocks_df)
 
-beta={}
-alpha={}
-
-for i in stocks_daily_return.columns:
-  if i!='Date' and i!='sp500':
-    b,a = capm_functions.calculate_beta(stocks_daily_return,i)
-    beta[i]=b
-    alpha[i]=a
+regression = capm_functions.calculate_betas(stocks_daily_return, resamples=capm_functions.BOOTSTRAP_RESAMPLES)
+beta = regression['beta'].to_dict()
+alpha = regression['alpha'].to_dict()
 
 beta_df = pd.DataFrame(columns=['Stock', 'Beta Value'])
 beta_df['Stock'] = beta.keys()
@@ -219,7 +276,7 @@ col1, col2 = st.columns(2)
 
 with col1:
   st.markdown('#### 📊 **Beta Coefficients**')
-  st.markdown("*Systematic risk relative to market*")
+  st.markdown("*Systematic risk relative to market, with 95% block-bootstrap intervals*")
   
   # Enhanced beta display
   for stock, beta_val in zip(beta_df['Stock'], beta_df['Beta Value']):
@@ -237,6 +294,7 @@ with col1:
     st.markdown(f"""
     <div style="background: white; padding: 1rem; margin: 0.5rem 0; border-radius: 8px; border-left: 4px solid {color};">
         <strong>{stock}</strong>: β = {beta_val} | {risk_level}
+        <br><small>95% CI: {regression.at[stock, 'beta_lo']:.2f} – {regression.at[stock, 'beta_hi']:.2f}</small>
     </div>
     """, unsafe_allow_html=True)
 
@@ -248,7 +306,7 @@ return_value =[]
 
 for stock, value in beta.items():
   return_value.append(str(round(rf+(value*(rm-rf)),2)))
-return_df['Stock'] = stocks_list
+return_df['Stock'] = list(beta)
 return_df['Return Value'] = return_value
 
 with col2:
@@ -271,11 +329,95 @@ with col2:
     st.markdown(f"""
     <div style="background: white; padding: 1rem; margin: 0.5rem 0; border-radius: 8px; border-left: 4px solid {color};">
         <strong>{stock}</strong>: {return_val}% | {perf_level}
+        <br><small>95% CI: {regression.at[stock, 'expected_return_lo']:.2f}% – {regression.at[stock, 'expected_return_hi']:.2f}%</small>
     </div>
     """, unsafe_allow_html=True)
 
+with st.expander("📐 Regression statistics"):
+  st.dataframe(regression.round(4), use_container_width=True)
+
 st.markdown('</div>', unsafe_allow_html=True)
 
+# Rolling beta section
+st.markdown("### 📉 **Rolling Beta & Alpha**")
+
+beta_window = st.selectbox(
+    "Window",
+    ('60 days', '120 days', '252 days', 'Exponential (60-day span)'),
+    index=2,
+    help="Beta and alpha re-estimated on a moving window of daily returns"
+)
+if beta_window.startswith('Exponential'):
+  rolling_b, rolling_a = capm_functions.ewm_beta(stocks_daily_return, 60)
+else:
+  rolling_b, rolling_a = capm_functions.rolling_beta(stocks_daily_return, int(beta_window.split()[0]))
+
+col1, col2 = st.columns(2)
+
+with col1:
+  st.markdown("#### 📊 **Rolling Beta**")
+  st.plotly_chart(capm_functions.interactive_plot(rolling_b.dropna(how='all', subset=rolling_b.columns[1:])), use_container_width=True)
+with col2:
+  st.markdown("#### 💹 **Rolling Alpha (daily, %)**")
+  st.plotly_chart(capm_functions.interactive_plot(rolling_a.dropna(how='all', subset=rolling_a.columns[1:])), use_container_width=True)
+
+# Portfolio section
+st.markdown("### 🧺 **Portfolio Optimization**")
+
+col1, col2 = st.columns(2)
+
+with col1:
+  return_source = st.radio(
+      "Expected returns",
+      ('CAPM', 'Historical'),
+      horizontal=True,
+      help="CAPM uses the expected returns above; Historical uses each stock's average return over the period"
+  )
+with col2:
+  simulations = st.selectbox(
+      "Simulated portfolios",
+      (10_000, 100_000, 1_000_000),
+      index=1,
+      format_func=lambda n: f"{n:,}",
+      help="Random long-only portfolios drawn to fill in the risk/return space"
+  )
+
+mean, cov = portfolio.annualized_moments(stocks_daily_return)
+if return_source == 'CAPM':
+  mean = pd.Series({stock: rf + beta[stock]*(rm - rf) for stock in mean.index})
+
+if len(mean) < 2:
+  st.info("Select at least two stocks to build a portfolio.")
+else:
+  simulation = stocks_daily_return.derived(
+      ('portfolios', return_source, simulations),
+      lambda: portfolio.simulate_portfolios(mean, cov, simulations, rf)
+  )
+  candidates = {
+      'Min variance': portfolio.min_variance_portfolio(mean, cov),
+      'Max Sharpe': portfolio.max_sharpe_portfolio(mean, cov, rf),
+      'Best simulated': simulation['max_sharpe'],
+  }
+  candidates = {name: w for name, w in candidates.items() if w is not None}
+  performance = {name: portfolio.portfolio_performance(w, mean, cov, rf) for name, w in candidates.items()}
+
+  st.plotly_chart(capm_functions.efficient_frontier_chart(
+      simulation, portfolio.efficient_frontier(mean, cov), mean, cov,
+      {name: (vol, ret) for name, (ret, vol, _) in performance.items()}
+  ), use_container_width=True)
+
+  col1, col2 = st.columns(2)
+
+  with col1:
+    st.markdown("#### ⚖️ **Portfolio Weights (%)**")
+    st.dataframe((pd.DataFrame(candidates)*100).round(2), use_container_width=True)
+  with col2:
+    st.markdown("#### 📊 **Portfolio Performance**")
+    st.dataframe(pd.DataFrame(performance, index=['Return (%)', 'Volatility (%)', 'Sharpe']).T.round(3), use_container_width=True)
+  if 'Max Sharpe' not in candidates:
+    st.caption("No tangency portfolio: the minimum-variance portfolio does not beat the risk-free rate.")
+  st.caption("Min variance and Max Sharpe are analytic and may include short positions; simulated portfolios are long-only.")
+
 # Summary insights
 st.markdown("### 💡 **Investment Insights**")
 
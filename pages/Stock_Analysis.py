@@ -1,11 +1,12 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 import plotly.graph_objects as go
 import plotly.express as px
 import datetime as dt
 import pandas_ta as pta
 from pages.utils.capm_functions import plotly_table, candlestick, close_chart, RSI, MACD, Moving_average
+from pages.utils.data_store import get_history
+from pages.utils.fundamentals import get_info, start_prefetch
 
 st.set_page_config(
   page_title="Stock Analysis",
@@ -29,12 +30,13 @@ with col3:
 
 st.subheader(ticker)
 
-stock = yf.Ticker(ticker)
+info = get_info(ticker)
+start_prefetch()
 
-st.write(stock.info['longBusinessSummary'])
-st.write("**Sector:**", stock.info['sector'])
-st.write("**Industry:**", stock.info['industry'])
-st.write("**Website:**", stock.info['website'])
+st.write(info['longBusinessSummary'])
+st.write("**Sector:**", info['sector'])
+st.write("**Industry:**", info['industry'])
+st.write("**Website:**", info['website'])
 
     
 col1, col2 = st.columns(2)
@@ -42,7 +44,7 @@ col1, col2 = st.columns(2)
 with col1:
   df = pd.DataFrame(index=['Market Cap','Previous Close','Open','Day Range','52 Week Range','Volume','Beta','Dividend Yield'])
   
-  df[''] = [stock.info['marketCap'], stock.info['previousClose'], stock.info['open'], stock.info['dayHigh'], stock.info['fiftyTwoWeekHigh'], stock.info['volume'], stock.info['beta'], stock.info['dividendYield']]
+  df[''] = [info['marketCap'], info['previousClose'], info['open'], info['dayHigh'], info['fiftyTwoWeekHigh'], info['volume'], info['beta'], info['dividendYield']]
   fig_df = plotly_table(df)
   
   st.plotly_chart(fig_df, use_container_width=True)
@@ -50,12 +52,12 @@ with col1:
 with col2:
   df = pd.DataFrame(index=['P/E Ratio','Forward P/E','Trailing EPS','Forward EPS','Price/Sales','Price/Book','Current Ratio','Debt/Equity'])
   
-  df[''] = [stock.info['trailingPE'],stock.info['forwardPE'],stock.info['trailingEps'],stock.info['forwardEps'],stock.info['priceToSalesTrailing12Months'],stock.info['priceToBook'],stock.info['currentRatio'],stock.info['debtToEquity']]
+  df[''] = [info['trailingPE'],info['forwardPE'],info['trailingEps'],info['forwardEps'],info['priceToSalesTrailing12Months'],info['priceToBook'],info['currentRatio'],info['debtToEquity']]
   fig_df = plotly_table(df)
   
   st.plotly_chart(fig_df, use_container_width=True)
   
-data = yf.download(ticker, start=start_date, end=end_date)
+data = get_history(ticker, start_date, end_date)[['Open', 'High', 'Low', 'Close', 'Volume']]
 
 latest_close = float(data['Close'].iloc[-1])
 prev_close = float(data['Close'].iloc[-2])
@@ -112,47 +114,45 @@ with col2:
   else:
     indicators = st.selectbox('',('RSI', 'MACD', 'Moving Average'))
     
-ticker_ = yf.Ticker(ticker)
-new_df1 = ticker_.history(period = 'max')
-data1 = ticker_.history(period = 'max')
+data1 = get_history(ticker)
 if num_period =='':
   if chart_type =='Candlestick' and indicators =='RSI':
-    st.plotly_chart(candlestick(data1,'1y'), use_container_width=True)
-    st.plotly_chart(RSI(data1,'1y'), use_container_width=True)
+    st.plotly_chart(candlestick(data1, '1y', ticker), use_container_width=True)
+    st.plotly_chart(RSI(data1, '1y', ticker), use_container_width=True)
 
   if chart_type =='Candlestick' and indicators =='MACD':
-    st.plotly_chart(candlestick(data1,'1y'), use_container_width=True)
-    st.plotly_chart(MACD(data1,'1y'), use_container_width=True)  
+    st.plotly_chart(candlestick(data1, '1y', ticker), use_container_width=True)
+    st.plotly_chart(MACD(data1, '1y', ticker), use_container_width=True)  
     
   if chart_type =='Line' and indicators =='RSI':
-    st.plotly_chart(close_chart(data1,'1y'), use_container_width=True)
-    st.plotly_chart(RSI(data1,'1y'), use_container_width=True)
+    st.plotly_chart(close_chart(data1, '1y', ticker), use_container_width=True)
+    st.plotly_chart(RSI(data1, '1y', ticker), use_container_width=True)
     
   if chart_type =='Line' and indicators =='Moving Average':
-    st.plotly_chart(Moving_average(data1,'1y'), use_container_width=True)
+    st.plotly_chart(Moving_average(data1, '1y', ticker), use_container_width=True)
     
   if chart_type =='Line' and indicators =='MACD':
-    st.plotly_chart(close_chart(data1,'1y'), use_container_width=True)
-    st.plotly_chart(MACD(data1,'1y'), use_container_width=True)
+    st.plotly_chart(close_chart(data1, '1y', ticker), use_container_width=True)
+    st.plotly_chart(MACD(data1, '1y', ticker), use_container_width=True)
     
 else:
   
   if chart_type =='Candlestick' and indicators =='RSI':
-    st.plotly_chart(candlestick(new_df1,num_period), use_container_width=True)
-    st.plotly_chart(RSI(new_df1, num_period), use_container_width=True)
+    st.plotly_chart(candlestick(data1, num_period, ticker), use_container_width=True)
+    st.plotly_chart(RSI(data1, num_period, ticker), use_container_width=True)
     
   if chart_type =='Candlestick' and indicators =='MACD':
-    st.plotly_chart(candlestick(new_df1,num_period), use_container_width=True)
-    st.plotly_chart(MACD(new_df1,num_period), use_container_width=True)
+    st.plotly_chart(candlestick(data1, num_period, ticker), use_container_width=True)
+    st.plotly_chart(MACD(data1, num_period, ticker), use_container_width=True)
     
   if chart_type =='Line' and indicators =='RSI':
-    st.plotly_chart(close_chart(new_df1,num_period), use_container_width=True)
-    st.plotly_chart(RSI(new_df1,num_period), use_container_width=True)  
+    st.plotly_chart(close_chart(data1, num_period, ticker), use_container_width=True)
+    st.plotly_chart(RSI(data1, num_period, ticker), use_container_width=True)  
     
   if chart_type =='Line' and indicators =='Moving Average':
-    st.plotly_chart(Moving_average(new_df1,num_period), use_container_width=True)
+    st.plotly_chart(Moving_average(data1, num_period, ticker), use_container_width=True)
     
   if chart_type =='Line' and indicators =='MACD':
-    st.plotly_chart(close_chart(new_df1,num_period), use_container_width=True)
-    st.plotly_chart(MACD(new_df1,num_period), use_container_width=True)
+    st.plotly_chart(close_chart(data1, num_period, ticker), use_container_width=True)
+    st.plotly_chart(MACD(data1, num_period, ticker), use_container_width=True)
   
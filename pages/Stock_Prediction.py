@@ -1,7 +1,9 @@
 import streamlit as st
-from pages.utils.model import evaluate_model, get_forecast, get_data, get_differencing_order, get_rolling_mean, scaling, inverse_scaling
+from pages.utils.pipeline import run_prediction
 import pandas as pd
 from pages.utils.capm_functions import plotly_table, Moving_average_forecast
+from pages.utils.backtest import load_results, run_backtest, summarize
+from pages.utils.config import WATCHLIST
 
 st.set_page_config(
     page_title="Stock Prediction",
@@ -101,6 +103,16 @@ with col3:
         <h3 style="color: #667eea;">ARIMA</h3>
     </div>
     """, unsafe_allow_html=True)
+    order_mode = st.selectbox("🧮 Model Order", ["Fixed (30, d, 1)", "Search by AIC", "Search by BIC"],
+                              help="Search fits a grid of AR and MA orders and keeps the one with the lowest information criterion")
+    prune = st.checkbox("✂️ Prune order search (approximate)", value=False,
+                        disabled=order_mode == "Fixed (30, d, 1)",
+                        help="Skip candidates whose estimated best score cannot beat the best so far. Faster, but the "
+                             "estimate is a heuristic, so the search may miss the order with the lowest criterion")
+    engine = st.selectbox("⚡ Engine", ["ARIMA (statsmodels)", "Fast AR (NumPy)"],
+                          help="Fast AR fits only the autoregressive part of the order by least squares, in milliseconds")
+    engine = 'fast' if engine == "Fast AR (NumPy)" else 'arima'
+    order_mode = {"Fixed (30, d, 1)": 'fixed', "Search by AIC": 'aic', "Search by BIC": 'bic'}[order_mode]
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -114,14 +126,13 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-# Show processing steps
+# Show processing steps; every stage is memoized, so an unchanged ticker and setup reruns instantly
 with st.spinner('🔄 Processing data and training model...'):
-    close_price = get_data(ticker)
-    rolling_price = get_rolling_mean(close_price)
-
-    differencing_order = get_differencing_order(rolling_price)
-    scaled_data, scaler = scaling(rolling_price)
-    rmse = evaluate_model(scaled_data, differencing_order)
+    prediction = run_prediction(ticker, order_mode, engine, prune=prune)
+    rolling_price = prediction['rolling']
+    differencing_order = prediction['d']
+    order, order_scores = prediction['order']
+    rmse = prediction['evaluate']
 
 # Model performance metrics
 st.markdown('<div class="model-metrics">', unsafe_allow_html=True)
@@ -157,12 +168,19 @@ with metric_col3:
     </div>
     """, unsafe_allow_html=True)
 
+st.markdown(f"**Model:** ARIMA{order}" if engine == 'arima' else f"**Model:** AR({order[0]}) on {order[1]}x differenced prices (fast)")
+if order_scores is not None:
+    with st.expander("🧮 Order Search Scores"):
+        st.dataframe(order_scores.round(2), use_container_width=True, hide_index=True)
+
+with st.expander("⏱️ Pipeline Timings"):
+    st.dataframe(prediction.timings.assign(ms=prediction.timings['seconds'] * 1000).drop(columns='seconds').round(1),
+                 use_container_width=True, hide_index=True)
+
 st.markdown('</div>', unsafe_allow_html=True)
 
-# Generate forecast
-forecast = get_forecast(scaled_data, differencing_order)
-# Inverse scale forecasted values
-forecast['Close'] = inverse_scaling(scaler, forecast['Close'])
+# Forecast, inverse scaled to prices
+forecast = prediction['inverse']
 # Prepare a DataFrame for plotting: combine historical and forecast
 historical = rolling_price.copy()
 if isinstance(historical, pd.Series):
@@ -265,6 +283,35 @@ with insights_col2:
     </div>
     """, unsafe_allow_html=True)
 
+# Walk-forward backtest
+with st.expander("🧪 Walk-forward Backtest"):
+    st.markdown("*Refit the model at rolling origins and score each 30-day forecast against what followed, "
+                "with the model order and engine selected above*")
+    bt_col1, bt_col2, bt_col3, bt_col4 = st.columns(4)
+    with bt_col1:
+        bt_scope = st.radio("Tickers", [ticker.upper(), "Watchlist"], horizontal=True)
+    with bt_col2:
+        bt_window = st.radio("Training window", ["expanding", "rolling"], horizontal=True)
+    with bt_col3:
+        bt_origins = st.number_input("Origins per ticker", min_value=1, max_value=100, value=10)
+    with bt_col4:
+        bt_step = st.number_input("Bars between origins", min_value=1, max_value=60, value=5)
+
+    if st.button("Run backtest"):
+        with st.spinner('🔄 Running walk-forward backtest...'):
+            bt_results = run_backtest([ticker.upper()] if bt_scope != "Watchlist" else WATCHLIST,
+                                      window=bt_window, origins=int(bt_origins), step=int(bt_step),
+                                      order_mode=order_mode, engine=engine, prune=prune)
+        if len(bt_results):
+            st.dataframe(summarize(bt_results).round(3), use_container_width=True, hide_index=True)
+        else:
+            st.warning("Not enough history for a single backtest origin.")
+
+    bt_history = load_results()
+    if len(bt_history):
+        st.markdown("**Saved runs by model configuration**")
+        st.dataframe(summarize(bt_history, by=['config']).round(3), use_container_width=True, hide_index=True)
+
 # Disclaimer
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,207 @@
+import os
+import time
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+from pages.utils.config import WATCHLIST
+from pages.utils.data_store import STORE_DIR, fetch_closes
+from pages.utils.model import ENGINES, fast_ar_forecast, get_differencing_order
+from pages.utils.model_cache import DEFAULT_POLICY, FORECAST_STEPS, update_fit
+from pages.utils.order_search import CRITERIA, search_order
+from pages.utils.providers import get_provider
+
+# Walk-forward backtest of the ARIMA forecaster. Each ticker's series (the 7-day rolling mean of its
+# closes, as on the prediction page) is fitted at a number of origins `step` bars apart, on the bars
+# before the origin (all of them, or the last `train` for a rolling window) standard-scaled as the
+# page does, and scored on the `horizon` bars after it in price units. As on the page, the order is
+# either fixed or has its p and q searched by AIC or BIC (once per ticker, on the bars before its first
+# origin), and forecasts come from the ARIMA or the fast AR engine.
+#
+# Origins of a ticker run in order in one process, so each fit extends or warm-starts from the
+# previous one (model_cache.update_fit). A ticker's chain is never split, so which origins are
+# appended, warm-refitted or cold-fitted, and hence the forecasts, do not depend on the number of
+# workers. Tickers run across a process pool; each worker gets an equal share of the BLAS threads so
+# the pool does not oversubscribe the cores. Each run is saved as one Parquet file of per-origin rows,
+# per market data provider (the synthetic provider reuses real ticker names):
+#
+#   <STORE_DIR>/yahoo/backtests/20260118T101500_arima_30-auto-1_expanding250_h30_s7.parquet
+
+ORDER = (30, None, 1)
+TRAIN = 250
+HORIZON = 30
+STEP = 5
+ORIGINS = 20
+SMOOTHING = 7
+START = '2024-01-01'
+ORDER_MODES = ('fixed',) + CRITERIA
+
+
+# Function to name a model configuration; rows of one configuration compare across runs
+
+def config_label(order=ORDER, window='expanding', train=TRAIN, horizon=HORIZON, smoothing=SMOOTHING,
+                 order_mode='fixed', engine='arima', prune=False):
+    p, d, q = order
+    d = 'auto' if d is None else d
+    model = f'{p}-{d}-{q}' if order_mode == 'fixed' else f"{order_mode}{'pruned' if prune else ''}-{d}"
+    return f'{engine}_{model}_{window}{train}_h{horizon}_s{smoothing}'
+
+
+# Function to score one forecast against the actual bars: RMSE and MAPE (in percent), and the
+# share of bars (in percent) on which the forecast moved away from the last known value in the
+# same direction as the actual series
+
+def forecast_errors(actual, forecast, last):
+    error = forecast - actual
+    rmse = np.sqrt(np.mean(error ** 2))
+    mape = np.mean(np.abs(error) / np.abs(actual)) * 100
+    direction = np.mean(np.sign(forecast - last) == np.sign(actual - last)) * 100
+    return rmse, mape, direction
+
+
+# Positions of the origins (the first forecast bar) of a series of `length` bars; the last origin
+# leaves exactly `horizon` bars to score, and every origin has at least `train` bars before it
+
+def origin_positions(length, train=TRAIN, horizon=HORIZON, step=STEP, origins=ORIGINS):
+    last = length - horizon
+    first = max(train, last - step * (origins - 1))
+    return list(range(last, first - 1, -step))[::-1] if last >= train else []
+
+
+def _scaled(history):
+    mean, std = history.mean(), history.std()
+    return (history - mean) / std, mean, std
+
+
+def _walk(ticker, dates, prices, positions, order, window, train, horizon, policy, order_mode, engine, prune,
+          threads):
+    rows = []
+    with threadpool_limits(limits=threads):
+        p, d, q = order
+        first = prices[0 if window == 'expanding' else positions[0] - train:positions[0]]
+        if d is None:
+            d = get_differencing_order(pd.Series(first))
+        if order_mode != 'fixed':
+            # searched once, before the first origin, so no origin's order has seen its test bars;
+            # sequentially, as this already runs in a worker of the backtest's pool
+            p, d, q = search_order(_scaled(first)[0], d, ticker, criterion=order_mode, max_workers=1, prune=prune)[0]
+        previous = None
+        for i in positions:
+            history = prices[0 if window == 'expanding' else i - train:i]
+            scaled, mean, std = _scaled(history)
+            t0 = time.perf_counter()
+            if engine == 'fast':
+                forecast, method = fast_ar_forecast(scaled, d, p, steps=horizon), 'fast'
+            else:
+                fitted = update_fit(scaled, (p, d, q), [previous] if previous else [], policy)
+                forecast, method = fitted.forecast[:horizon], fitted.method
+                previous = fitted
+            seconds = time.perf_counter() - t0
+
+            forecast = forecast * std + mean
+            rmse, mape, direction = forecast_errors(prices[i:i + horizon], forecast, history[-1])
+            rows.append({
+                'ticker': ticker, 'origin': dates[i], 'train_bars': len(history), 'p': p, 'd': d, 'q': q,
+                'engine': engine, 'method': method, 'fit_s': seconds, 'rmse': rmse, 'mape': mape,
+                'directional_accuracy': direction,
+            })
+    return rows
+
+
+# Function to run the walk-forward backtest over tickers. order_mode is 'fixed' (use order) or 'aic' or
+# 'bic' (search p and q; d as in order; with prune, approximately, see order_search), engine 'arima' or
+# 'fast' (an AR(p) on the differenced series).
+# Returns one row per (ticker, origin) with the order, the fit method used (cold, warm or append for
+# ARIMA, fast otherwise), its time, and the forecast's RMSE, MAPE and directional accuracy. Tickers that
+# cannot be loaded or are too short for a single origin are left out.
+# With save, the rows are also written to the provider's backtest directory (see save_results).
+
+def run_backtest(tickers=WATCHLIST, order=ORDER, window='expanding', train=TRAIN, horizon=HORIZON, step=STEP,
+                 origins=ORIGINS, smoothing=SMOOTHING, start=START, end=None, policy=DEFAULT_POLICY,
+                 max_workers=None, save=True, order_mode='fixed', engine='arima', prune=False):
+    if order_mode not in ORDER_MODES:
+        raise ValueError(f'order_mode must be one of {ORDER_MODES}')
+    if engine not in ENGINES:
+        raise ValueError(f'engine must be one of {ENGINES}')
+    if horizon > FORECAST_STEPS:
+        raise ValueError(f'horizon must be at most {FORECAST_STEPS} bars')
+    if window not in ('expanding', 'rolling'):
+        raise ValueError("window must be 'expanding' or 'rolling'")
+
+    closes, _ = fetch_closes(tickers, start, end, benchmark=None, errors='skip')
+    series = {}
+    for ticker, close in closes.items():
+        close = close.dropna()
+        if smoothing > 1:
+            close = close.rolling(window=smoothing).mean().dropna()
+        positions = origin_positions(len(close), train, horizon, step, origins)
+        if positions:
+            series[ticker] = (close.index, close.to_numpy(dtype='float64'), positions)
+
+    # one task per ticker: its origins form one chain of fits
+    prune = bool(prune) and order_mode != 'fixed'
+    tasks = [(ticker, dates, prices, positions, order, window, train, horizon, policy, order_mode, engine, prune)
+             for ticker, (dates, prices, positions) in series.items()]
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(max_workers or cpus, len(tasks)))
+    threads = max(1, cpus // workers)
+
+    if workers <= 1:
+        parts = [_walk(*task, threads) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_walk, *task, threads) for task in tasks]
+            parts = [f.result() for f in futures]
+
+    results = pd.DataFrame([row for part in parts for row in part],
+                           columns=['ticker', 'origin', 'train_bars', 'p', 'd', 'q', 'engine', 'method', 'fit_s',
+                                    'rmse', 'mape', 'directional_accuracy'])
+    results.insert(0, 'config', config_label(order, window, train, horizon, smoothing, order_mode, engine,
+                                              prune))
+    results.insert(1, 'provider', get_provider().name)
+    results = results.sort_values(['ticker', 'origin'], ignore_index=True)
+    if save and len(results):
+        save_results(results)
+    return results
+
+
+# Directory of the saved runs of the current market data provider
+
+def backtest_dir():
+    return os.path.join(STORE_DIR, get_provider().name, 'backtests')
+
+
+# Function to write a run's rows to the provider's backtest directory; returns the file's path
+
+def save_results(results, directory=None):
+    directory = directory or backtest_dir()
+    run = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{run}_{results['config'].iloc[0]}.parquet")
+    results.assign(run=run).to_parquet(path, index=False)
+    return path
+
+
+# Function to read back every saved run of the current provider (empty frame when there are none)
+
+def load_results(directory=None):
+    directory = directory or backtest_dir()
+    if not os.path.isdir(directory):
+        return pd.DataFrame()
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.parquet'))
+    if not paths:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+
+# Function to summarise backtest rows per `by` group: origins scored, mean errors, and total fit time
+
+def summarize(results, by=('config', 'ticker')):
+    return results.groupby(list(by)).agg(
+        origins=('rmse', 'size'),
+        rmse=('rmse', 'mean'),
+        mape=('mape', 'mean'),
+        directional_accuracy=('directional_accuracy', 'mean'),
+        fit_s=('fit_s', 'sum'),
+    ).reset_index()
@@ -3,14 +3,22 @@ import plotly.express as px
 import numpy as np
 import plotly.graph_objects as go
 import dateutil
-import datetime
-import pandas_ta as pta
+import pandas as pd
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pages.utils.indicators import compute_indicators
+from pages.utils.pyramid import Pyramid, get_pyramid
+from pages.utils.panel import PricePanel
 
-# function to plot interactive plotly chart
+# function to plot interactive plotly chart (of a Date/ticker frame or a PricePanel)
 def interactive_plot(df):
   fig = px.line()
-  for i in df.columns[1:]:
-    fig.add_scatter(x = df['Date'], y = df[i], name =i)
+  if isinstance(df, PricePanel):
+    for j, i in enumerate(df.columns):
+      fig.add_scatter(x = df.dates, y = df.values[:, j], name =i)
+  else:
+    for i in df.columns[1:]:
+      fig.add_scatter(x = df['Date'], y = df[i], name =i)
   fig.update_layout(width=450, margin = dict(l=20,r=20,b=20,t=50), legend= dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
   return fig
 
@@ -18,29 +26,278 @@ def interactive_plot(df):
 # Function to normalize the prices based on the initial price
 
 def normalize(df_2):
+  if isinstance(df_2, PricePanel):
+    return df_2.derived('normalize', lambda: df_2.with_values(df_2.values/df_2.values[0]))
   df = df_2.copy()
   for i in df.columns[1:]:
     df[i] = df[i]/df[i][0]
   return df
 
 
-# Function to calculate daily returns
+# Function to calculate daily returns (in percent) for a whole 2D price block at once.
+# kind is 'simple' or 'log'. With skip_gaps, a return after missing prices is taken from the last
+# valid price and every column starts at 0 on its own first valid price (for mismatched start dates).
+
+def returns_matrix(prices, kind='simple', skip_gaps=False):
+  prices = np.asarray(prices, dtype='float64')
+  base = prices
+  if skip_gaps:
+    rows = np.where(np.isnan(prices), 0, np.arange(len(prices))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    base = np.take_along_axis(prices, rows, axis=0)
+  returns = np.empty_like(prices)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    if kind == 'log':
+      returns[1:] = np.log(prices[1:]/base[:-1])*100
+    else:
+      returns[1:] = ((prices[1:]-base[:-1])/base[:-1])*100
+  returns[:1] = 0
+  if skip_gaps:
+    valid = ~np.isnan(prices)
+    first = valid & (np.cumsum(valid, axis=0) == 1)
+    returns[first] = 0
+  return returns
+
 
-def daily_returns(df_2):
+# Function to calculate daily returns; for a PricePanel the result is a panel too, computed once per panel
+
+def daily_returns(df_2, kind='simple', skip_gaps=False):
+  if isinstance(df_2, PricePanel):
+    return df_2.derived(('returns', kind, skip_gaps), lambda: df_2.with_values(returns_matrix(df_2.values, kind, skip_gaps)))
   df_daily_return = df_2.copy()
-  for i in df_2.columns[1:]:
-    for j in range(1,len(df_2)):
-      df_daily_return.loc[j,i] = ((df_2.loc[j,i]-df_2.loc[j-1,i])/df_2.loc[j-1,i])*100
-    df_daily_return.loc[0,i] = 0
+  columns = df_2.columns[1:]
+  df_daily_return[columns] = returns_matrix(df_2[columns].to_numpy(dtype='float64'), kind, skip_gaps)
   return df_daily_return
 
+# Function to regress every column of returns on the benchmark returns at once.
+# Missing values are dropped per column (valid, when given, is the precomputed ~isnan of returns).
+# Returns beta, alpha, r2, resid_vol (daily residual standard deviation, in the units of the returns),
+# beta_se and alpha_se for each column.
+
+def regression_stats(benchmark_returns, returns, columns, valid=None):
+  x = np.asarray(benchmark_returns, dtype='float64')
+  y = np.asarray(returns, dtype='float64')
+  mask = (~np.isnan(y) if valid is None else valid) & ~np.isnan(x)[:, None]
+  m = mask.astype('float64')
+  n = m.sum(axis=0)
+
+  # center on overall means first so the sums below do not lose precision
+  x_shift = np.nanmean(x)
+  y_shift = np.nanmean(np.where(mask, y, np.nan), axis=0)
+  xc = np.where(np.isnan(x), 0, x - x_shift)
+  yc = np.where(mask, y - y_shift, 0)
+
+  sx = m.T @ xc
+  sxx = m.T @ (xc * xc)
+  sy = yc.sum(axis=0)
+  syy = (yc * yc).sum(axis=0)
+  sxy = yc.T @ xc
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    cxx = sxx - sx * sx / n
+    cyy = syy - sy * sy / n
+    cxy = sxy - sx * sy / n
+    beta = cxy / cxx
+    mean_x = sx / n + x_shift
+    alpha = sy / n + y_shift - beta * mean_x
+    r2 = cxy * cxy / (cxx * cyy)
+    resid_var = np.maximum(cyy - beta * cxy, 0) / (n - 2)
+    beta_se = np.sqrt(resid_var / cxx)
+    alpha_se = np.sqrt(resid_var * (1 / n + mean_x ** 2 / cxx))
+
+  return pd.DataFrame({
+    'beta': beta, 'alpha': alpha, 'r2': r2, 'resid_vol': np.sqrt(resid_var),
+    'beta_se': beta_se, 'alpha_se': alpha_se, 'observations': n,
+  }, index=pd.Index(columns, name='Stock'))
+
+
+# Dates, stock columns, benchmark returns, stock returns and their validity mask (None when it has
+# to be computed) of a daily returns frame or panel. Panels hand out views of their block.
+
+def _regression_inputs(stocks_daily_return, benchmark):
+  data = stocks_daily_return
+  if isinstance(data, PricePanel) and data.benchmark == benchmark:
+    x = data.values[:, data.columns.index(benchmark)]
+    return data.dates, data.stocks, x, data.stock_values, data.stock_valid
+  if isinstance(data, PricePanel):
+    data = data.to_frame()
+  columns = [c for c in data.columns if c not in ('Date', benchmark)]
+  x = data[benchmark].to_numpy(dtype='float64')
+  y = data[columns].to_numpy(dtype='float64')
+  return data['Date'].to_numpy(), columns, x, y, None
+
+
+# Function to calculate beta and regression statistics for every stock against the benchmark.
+# With resamples, block-bootstrap confidence intervals are added (see bootstrap_intervals); for a
+# PricePanel the result is computed once per panel and settings.
+
+def calculate_betas(stocks_daily_return, benchmark='sp500', resamples=0, confidence=0.95, rf=0, seed=0):
+  if isinstance(stocks_daily_return, PricePanel):
+    return stocks_daily_return.derived(('betas', benchmark, resamples, confidence, rf, seed),
+                                       lambda: _calculate_betas(stocks_daily_return, benchmark, resamples, confidence, rf, seed))
+  return _calculate_betas(stocks_daily_return, benchmark, resamples, confidence, rf, seed)
+
+
+def _calculate_betas(stocks_daily_return, benchmark, resamples, confidence, rf, seed):
+  _, columns, x, y, valid = _regression_inputs(stocks_daily_return, benchmark)
+  stats = regression_stats(x, y, columns, valid)
+  if resamples:
+    stats = stats.join(bootstrap_intervals(stocks_daily_return, benchmark, resamples, confidence, rf=rf, seed=seed))
+  return stats
+
+
+def _moments(x, y, valid):
+  mask = (~np.isnan(y) if valid is None else valid) & ~np.isnan(x)[:, None]
+  x_shift = np.nanmean(x)
+  y_shift = np.nanmean(np.where(mask, y, np.nan), axis=0)
+  xc = np.where(mask, (x - x_shift)[:, None], 0)
+  yc = np.where(mask, y - y_shift, 0)
+  # per-row terms whose (rolling or weighted) averages give the regression moments
+  moments = (mask.astype('float64'), xc, yc, xc * xc, xc * yc)
+  return x_shift, y_shift, moments
+
+
+def _moment_series(stocks_daily_return, benchmark):
+  dates, columns, x, y, valid = _regression_inputs(stocks_daily_return, benchmark)
+  return (dates, columns) + _moments(x, y, valid)
+
+
+# Sums of a over every window of `window` rows ending at each row (partial windows at the start)
+
+def _window_sums(a, window):
+  total = np.cumsum(a, axis=0)
+  total[window:] -= total[:-window].copy()
+  return total
+
+
+def _beta_alpha(columns, dates, x_shift, y_shift, n, sx, sy, sxx, sxy):
+  with np.errstate(invalid='ignore', divide='ignore'):
+    beta = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+    alpha = sy / n + y_shift - beta * (sx / n + x_shift)
+  beta_df = pd.DataFrame(beta, columns=columns)
+  alpha_df = pd.DataFrame(alpha, columns=columns)
+  beta_df.insert(0, 'Date', dates)
+  alpha_df.insert(0, 'Date', dates)
+  return beta_df, alpha_df
+
+
+# Function to calculate rolling beta and alpha of every stock over the last `window` observations.
+# Window sums come from cumulative sums, so sliding the window costs O(1) per step whatever its length.
+# Returns (beta, alpha) frames shaped like the input, NaN where the window holds fewer than
+# min_periods observations (default: the full window).
+
+def rolling_beta(stocks_daily_return, window, benchmark='sp500', min_periods=None):
+  dates, columns, x_shift, y_shift, moments = _moment_series(stocks_daily_return, benchmark)
+  n, sx, sy, sxx, sxy = (_window_sums(a, window) for a in moments)
+  n = np.where(n >= (min_periods or window), n, np.nan)
+  return _beta_alpha(columns, dates, x_shift, y_shift, n, sx, sy, sxx, sxy)
+
+
+# Function to calculate exponentially weighted beta and alpha (weights decay with the given span)
+
+def ewm_beta(stocks_daily_return, span, benchmark='sp500'):
+  dates, columns, x_shift, y_shift, moments = _moment_series(stocks_daily_return, benchmark)
+  n, sx, sy, sxx, sxy = (pd.DataFrame(a).ewm(span=span, min_periods=span).mean().to_numpy() for a in moments)
+  return _beta_alpha(columns, dates, x_shift, y_shift, n, sx, sy, sxx, sxy)
+
+
+# Moving block bootstrap. Every resample strings together `blocks` blocks of block_length consecutive
+# days, so it is fully described by how often each block start is drawn. The regression moments of
+# every possible block are summed once, and a batch of resamples is then a single matrix product:
+# (resamples x starts) counts @ (starts x moments) block sums.
+# Resamples are drawn BOOTSTRAP_BATCH at a time; more than BOOTSTRAP_POOL_COLUMNS stocks are split
+# across a process pool, each worker drawing the same resamples from the seed.
+
+BOOTSTRAP_RESAMPLES = 10000
+BOOTSTRAP_BATCH = 1000
+BOOTSTRAP_POOL_COLUMNS = 500
+
+
+def _bootstrap_quantiles(block_sums, market_sums, x_shift, y_shift, resamples, blocks, seed, quantiles, rf):
+  rng = np.random.default_rng(seed)
+  starts = len(block_sums)
+  stocks = block_sums.shape[1] // 5
+  sums = np.hstack([block_sums, market_sums])
+  draws = {'beta': [], 'alpha': [], 'expected_return': []}
+  for first in range(0, resamples, BOOTSTRAP_BATCH):
+    size = min(BOOTSTRAP_BATCH, resamples - first)
+    picks = rng.integers(0, starts, size=(size, blocks)) + np.arange(size)[:, None] * starts
+    counts = np.bincount(picks.ravel(), minlength=size * starts).reshape(size, starts).astype('float64')
+    moments = counts @ sums
+    n, sx, sy, sxx, sxy = (moments[:, i * stocks:(i + 1) * stocks] for i in range(5))
+    with np.errstate(invalid='ignore', divide='ignore'):
+      beta = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+      alpha = sy / n + y_shift - beta * (sx / n + x_shift)
+      rm = (moments[:, -1] / moments[:, -2] + x_shift) * 252
+    draws['beta'].append(beta)
+    draws['alpha'].append(alpha)
+    draws['expected_return'].append(rf + beta * (rm - rf)[:, None])
+  return {k: np.nanquantile(np.vstack(v), quantiles, axis=0) for k, v in draws.items()}
+
+
+def _bootstrap(x, y, valid, columns, resamples, confidence, block_length, rf, seed, max_workers):
+  x_shift, y_shift, moments = _moments(x, y, valid)
+  days = len(x)
+  block_length = block_length or max(1, round(days ** (1 / 3)))
+  blocks = -(-days // block_length)
+
+  # sums over the block starting at each row: the five moments of every stock, then the number and
+  # sum of the market returns
+  block_sums = [_window_sums(a, block_length)[block_length - 1:] for a in moments]
+  market_valid = ~np.isnan(x)
+  market = np.column_stack([market_valid, np.where(market_valid, x - x_shift, 0)]).astype('float64')
+  market_sums = _window_sums(market, block_length)[block_length - 1:]
+
+  tail = (1 - confidence) / 2
+  settings = (resamples, blocks, seed, [tail, 1 - tail], rf)
+  workers = max_workers or os.cpu_count() or 1
+  if len(columns) > BOOTSTRAP_POOL_COLUMNS and workers > 1:
+    chunks = np.array_split(np.arange(len(columns)), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      futures = [pool.submit(_bootstrap_quantiles, np.hstack([a[:, c] for a in block_sums]), market_sums,
+                             x_shift, y_shift[c], *settings) for c in chunks]
+      parts = [f.result() for f in futures]
+    result = {k: np.hstack([part[k] for part in parts]) for k in parts[0]}
+  else:
+    result = _bootstrap_quantiles(np.hstack(block_sums), market_sums, x_shift, y_shift, *settings)
+
+  intervals = {}
+  for name, (lo, hi) in result.items():
+    intervals[f'{name}_lo'] = lo
+    intervals[f'{name}_hi'] = hi
+  return pd.DataFrame(intervals, index=pd.Index(columns, name='Stock'))
+
+
+# Function to get block-bootstrap confidence intervals of beta, alpha and CAPM expected return (with
+# rf and the market return annualised as on the CAPM page) for every stock. block_length defaults to
+# the cube root of the number of days. Returns <name>_lo / <name>_hi columns indexed by Stock.
+
+def bootstrap_intervals(stocks_daily_return, benchmark='sp500', resamples=BOOTSTRAP_RESAMPLES, confidence=0.95,
+                        block_length=None, rf=0, seed=0, max_workers=None):
+  _, columns, x, y, valid = _regression_inputs(stocks_daily_return, benchmark)
+  return _bootstrap(x, y, valid, columns, resamples, confidence, block_length, rf, seed, max_workers)
+
+
+def _stock_inputs(stocks_daily_return, stock):
+  _, columns, x, y, valid = _regression_inputs(stocks_daily_return, 'sp500')
+  j = columns.index(stock)
+  return x, y[:, j:j + 1], None if valid is None else valid[:, j:j + 1]
+
+
 # Function to calculate beta
 
 def calculate_beta(stocks_daily_return, stock):
-  rm  = stocks_daily_return['sp500'].mean()*252
-  
-  b,a = np.polyfit(stocks_daily_return['sp500'],stocks_daily_return[stock],1)
-  return b,a
+  x, y, valid = _stock_inputs(stocks_daily_return, stock)
+  stats = regression_stats(x, y, [stock], valid).loc[stock]
+  return stats['beta'], stats['alpha']
+
+
+# Function to get the block-bootstrap confidence intervals of one stock's beta, alpha and expected
+# return, as a dict of <name>_lo / <name>_hi values
+
+def calculate_beta_intervals(stocks_daily_return, stock, resamples=BOOTSTRAP_RESAMPLES, confidence=0.95):
+  x, y, valid = _stock_inputs(stocks_daily_return, stock)
+  return _bootstrap(x, y, valid, [stock], resamples, confidence, None, 0, 0, 1).loc[stock].to_dict()
 
 
 def plotly_table(df):
@@ -75,39 +332,153 @@ def plotly_table(df):
 
 
 
-def filter_data(df, num_period):
+# Function to get the date a period code ('5d', '1mo', '6mo', 'ytd', '1y', '5y') counts back to from the last bar
+
+def period_start(last, num_period):
   if num_period == '1mo':
-    date = df.index[-1] + dateutil.relativedelta.relativedelta(months=-1)
+    return last + dateutil.relativedelta.relativedelta(months=-1)
   elif num_period == '5d':
-    date = df.index[-1] + dateutil.relativedelta.relativedelta(days=-5)
+    return last + dateutil.relativedelta.relativedelta(days=-5)
   elif num_period == '6mo':
-    date = df.index[-1] + dateutil.relativedelta.relativedelta(months=-6)
+    return last + dateutil.relativedelta.relativedelta(months=-6)
   elif num_period == '1y':
-    date = df.index[-1] + dateutil.relativedelta.relativedelta(years=-1)
+    return last + dateutil.relativedelta.relativedelta(years=-1)
   elif num_period == '5y':
-    date = df.index[-1] + dateutil.relativedelta.relativedelta(years=-5)
+    return last + dateutil.relativedelta.relativedelta(years=-5)
   elif num_period == 'ytd':
-    date = datetime.datetime(df.index[-1].year, 1, 1).strftime('%Y-%m-%d')
-  else:
-    date = df.index[0]
-    
-  return df.reset_index()[df.reset_index()['Date'] > date]
+    return last.replace(month=1, day=1)
+  return None
+
+
+def _as_index_time(index, date):
+  date = pd.Timestamp(date)
+  if index.tz is not None and date.tz is None:
+    date = date.tz_localize(index.tz)
+  return date
+
+
+# Function to slice a frame with a sorted DatetimeIndex to a period code, or to [start, end].
+# Binary search on the index gives the bounds, so the result is a view and nothing is copied.
+# Period codes keep the bars strictly after period_start(); 'max' (or no code) keeps everything.
+
+def filter_data(df, num_period=None, start=None, end=None):
+  index = df.index
+  lo, hi = 0, len(index)
+  if len(index) == 0:
+    return df
+  if num_period:
+    since = period_start(index[-1], num_period)
+    if since is not None:
+      lo = index.searchsorted(since, side='right')
+  elif start is not None:
+    lo = index.searchsorted(_as_index_time(index, start), side='left')
+  if end is not None:
+    hi = index.searchsorted(_as_index_time(index, end), side='right')
+  return df.iloc[lo:hi]
+
+# Most points drawn per chart trace; longer ranges are downsampled before plotting
+MAX_POINTS = 1500
+
+
+def _triangle_pick(ax, ay, bx, by, cx, cy, valid):
+  area = np.abs((ax[:, None] - cx[:, None]) * (by - ay[:, None]) - (ax[:, None] - bx) * (cy[:, None] - ay[:, None]))
+  area = np.where(valid & ~np.isnan(area), area, -1)
+  return np.argmax(area, axis=1)
+
+
+# Function to pick n_out points of a line with Largest-Triangle-Three-Buckets, plus the line's
+# highest and lowest points so extremes always stay visible. Returns positions into x / y.
+# All buckets are scored at once: a first pass anchors each bucket on the previous bucket's mean,
+# a second pass on the point the first pass picked there (classic LTTB walks the buckets one by one).
+
+def lttb_indices(x, y, n_out):
+  n = len(y)
+  if n_out >= n or n_out < 3:
+    return np.arange(n)
+  x = np.asarray(x, dtype='float64')
+  y = np.asarray(y, dtype='float64')
+  edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+  pos = edges[:-1, None] + np.arange(np.diff(edges).max())[None, :]
+  valid = pos < edges[1:, None]
+  pos = np.minimum(pos, edges[1:, None] - 1)
+  bx, by = x[pos], y[pos]
+
+  filled = valid & ~np.isnan(by)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    mean_x = np.where(valid, bx, 0).sum(axis=1) / valid.sum(axis=1)
+    mean_y = np.where(filled, by, 0).sum(axis=1) / filled.sum(axis=1)
+  cx, cy = np.append(mean_x[1:], x[-1]), np.append(mean_y[1:], y[-1])
+
+  ax, ay = np.insert(mean_x[:-1], 0, x[0]), np.insert(mean_y[:-1], 0, y[0])
+  cy = np.where(np.isnan(cy), ay, cy)
+  picked = pos[np.arange(len(pos)), _triangle_pick(ax, ay, bx, by, cx, cy, valid)]
+  ax, ay = np.insert(x[picked[:-1]], 0, x[0]), np.insert(y[picked[:-1]], 0, y[0])
+  picked = pos[np.arange(len(pos)), _triangle_pick(ax, ay, bx, by, cx, cy, valid)]
+
+  picked = np.concatenate([[0], picked, [n - 1]])
+  if not np.isnan(y).all():
+    picked = np.union1d(picked, [np.nanargmax(y), np.nanargmin(y)])
+  return picked
+
+
+# Function to downsample one line trace to about max_points points
+
+def downsample_line(index, values, max_points=MAX_POINTS):
+  if len(values) <= max_points:
+    return index, values
+  picked = lttb_indices(index.asi8 if hasattr(index, 'asi8') else np.arange(len(index)), values, max_points)
+  return index[picked], np.asarray(values)[picked]
+
+
+# Function to aggregate OHLC(V) bars into at most max_points buckets of consecutive bars
+# (first open, highest high, lowest low, last close, summed volume), dated by each bucket's first bar
+
+def downsample_ohlc(dataframe, max_points=MAX_POINTS):
+  n = len(dataframe)
+  if n <= max_points:
+    return dataframe
+  starts = np.unique(np.arange(n) * max_points // n, return_index=True)[1]
+  ends = np.append(starts[1:], n) - 1
+  bars = {
+    'Open': dataframe['Open'].to_numpy()[starts],
+    'High': np.fmax.reduceat(dataframe['High'].to_numpy(), starts),
+    'Low': np.fmin.reduceat(dataframe['Low'].to_numpy(), starts),
+    'Close': dataframe['Close'].to_numpy()[ends],
+  }
+  if 'Volume' in dataframe:
+    bars['Volume'] = np.add.reduceat(np.nan_to_num(dataframe['Volume'].to_numpy()), starts)
+  return pd.DataFrame(bars, index=dataframe.index[starts])
+
+
+# Function to get the bars of a period at the coarsest pyramid resolution that still fills the chart
+
+def resolution_bars(dataframe, num_period, ticker=None):
+    if len(dataframe) == 0:
+        return dataframe, 'Daily'
+    pyramid = get_pyramid(ticker, dataframe) if ticker is not None else Pyramid(dataframe)
+    return pyramid.select(period_start(dataframe.index[-1], num_period))
 
-def close_chart(dataframe, num_period=False):
+
+def close_chart(dataframe, num_period=False, ticker=None, max_points=MAX_POINTS):
+    resolution = 'Daily'
     if num_period:
-        dataframe = filter_data(dataframe, num_period)
+        dataframe, resolution = resolution_bars(dataframe, num_period, ticker)
     
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Open'],
+    x, y = downsample_line(dataframe.index, dataframe['Open'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='Open', line=dict(width=2.5, color='#3b82f6'),
                             hovertemplate='<b>Open</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Close'],
+    x, y = downsample_line(dataframe.index, dataframe['Close'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='Close', line=dict(width=3, color='#1e293b'),
                             hovertemplate='<b>Close</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['High'],
+    x, y = downsample_line(dataframe.index, dataframe['High'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='High', line=dict(width=2, color='#10b981'),
                             hovertemplate='<b>High</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Low'],
+    x, y = downsample_line(dataframe.index, dataframe['Low'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='Low', line=dict(width=2, color='#ef4444'),
                             hovertemplate='<b>Low</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
     
@@ -127,7 +498,7 @@ def close_chart(dataframe, num_period=False):
         margin=dict(l=10, r=20, t=40, b=10), 
         plot_bgcolor='white', 
         paper_bgcolor='#f8fafc',
-        title_text="Stock Price Analysis",
+        title_text="Stock Price Analysis" + ("" if resolution == 'Daily' else f" ({resolution})"),
         title_font_size=18,
         title_x=0.5,
         legend=dict(
@@ -147,11 +518,12 @@ def close_chart(dataframe, num_period=False):
     return fig
   
   
-def candlestick(dataframe, num_period):
-    dataframe = filter_data(dataframe, num_period)
+def candlestick(dataframe, num_period, ticker=None, max_points=MAX_POINTS):
+    dataframe, resolution = resolution_bars(dataframe, num_period, ticker)
+    dataframe = downsample_ohlc(dataframe, max_points)
     fig = go.Figure()
     fig.add_trace(go.Candlestick(
-        x=dataframe['Date'],
+        x=dataframe.index,
         open=dataframe['Open'], 
         high=dataframe['High'],
         low=dataframe['Low'], 
@@ -179,7 +551,7 @@ def candlestick(dataframe, num_period):
         margin=dict(l=10, r=20, t=40, b=10), 
         plot_bgcolor='white', 
         paper_bgcolor='#f8fafc',
-        title_text="Candlestick Chart",
+        title_text="Candlestick Chart" + ("" if resolution == 'Daily' else f" ({resolution})"),
         title_font_size=18,
         title_x=0.5,
         hoverlabel=dict(
@@ -191,14 +563,14 @@ def candlestick(dataframe, num_period):
     return fig
   
 
-def RSI(dataframe, num_period):
-    dataframe['RSI'] = pta.rsi(dataframe['Close'])
-    dataframe = filter_data(dataframe, num_period)
+def RSI(dataframe, num_period, ticker=None):
+    rsi = compute_indicators(dataframe['Close'], ('RSI_14',), ticker)
+    dataframe = filter_data(rsi.rename(columns={'RSI_14': 'RSI'}), num_period)
     fig = go.Figure()
     
     # Add RSI line with gradient effect
     fig.add_trace(go.Scatter(
-        x=dataframe['Date'],
+        x=dataframe.index,
         y=dataframe.RSI, 
         name='RSI', 
         line=dict(width=3, color='#f59e0b'),
@@ -207,7 +579,7 @@ def RSI(dataframe, num_period):
     
     # Add overbought line (70)
     fig.add_trace(go.Scatter(
-        x=dataframe['Date'],
+        x=dataframe.index,
         y=[70]*len(dataframe), 
         name='Overbought (70)', 
         line=dict(width=2, color='#dc2626', dash='dash'),
@@ -216,7 +588,7 @@ def RSI(dataframe, num_period):
     
     # Add oversold line (30) with fill
     fig.add_trace(go.Scatter(
-        x=dataframe['Date'],
+        x=dataframe.index,
         y=[30]*len(dataframe), 
         fill='tonexty', 
         name='Oversold (30)', 
@@ -228,7 +600,7 @@ def RSI(dataframe, num_period):
     # Add neutral zone
     fig.add_shape(
         type="rect",
-        x0=dataframe['Date'].iloc[0], x1=dataframe['Date'].iloc[-1],
+        x0=dataframe.index[0], x1=dataframe.index[-1],
         y0=30, y1=70,
         fillcolor="rgba(156, 163, 175, 0.1)",
         line=dict(width=0),
@@ -273,33 +645,38 @@ def RSI(dataframe, num_period):
     
     return fig
 
-def Moving_average(dataframe, num_period):
-    dataframe['SMA_50'] = pta.sma(dataframe['Close'], 50)
-    dataframe['SMA_20'] = pta.sma(dataframe['Close'], 20)
+def Moving_average(dataframe, num_period, ticker=None, max_points=MAX_POINTS):
+    sma = filter_data(compute_indicators(dataframe['Close'], ('SMA_50', 'SMA_20'), ticker), num_period)
     dataframe = filter_data(dataframe, num_period)
     fig = go.Figure()
     
     # Add price lines with improved styling
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Open'],
+    x, y = downsample_line(dataframe.index, dataframe['Open'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines',
                             name='Open', line=dict(width=2, color='#3b82f6'),
                             hovertemplate='<b>Open</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Close'],
+    x, y = downsample_line(dataframe.index, dataframe['Close'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines',
                             name='Close', line=dict(width=3, color='#1e293b'),
                             hovertemplate='<b>Close</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['High'],
+    x, y = downsample_line(dataframe.index, dataframe['High'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='High', line=dict(width=1.5, color='#10b981'),
                             hovertemplate='<b>High</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['Low'],
+    x, y = downsample_line(dataframe.index, dataframe['Low'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='Low', line=dict(width=1.5, color='#ef4444'),
                             hovertemplate='<b>Low</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
     
     # Add moving averages with enhanced styling
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['SMA_50'],
+    x, y = downsample_line(sma.index, sma['SMA_50'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='SMA 50', line=dict(width=2.5, color='#8b5cf6', dash='dot'),
                             hovertemplate='<b>SMA 50</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
-    fig.add_trace(go.Scatter(x=dataframe['Date'], y=dataframe['SMA_20'],
+    x, y = downsample_line(sma.index, sma['SMA_20'], max_points)
+    fig.add_trace(go.Scatter(x=x, y=y,
                             mode='lines', name='SMA 20', line=dict(width=2.5, color='#f59e0b', dash='dashdot'),
                             hovertemplate='<b>SMA 20</b><br>Date: %{x}<br>Price: $%{y:.2f}<extra></extra>'))
     
@@ -339,20 +716,16 @@ def Moving_average(dataframe, num_period):
     return fig
   
 
-def MACD(dataframe, num_period):
-    macd = pta.macd(dataframe['Close']).iloc[:,0]
-    macd_signal = pta.macd(dataframe['Close']).iloc[:,1]
-    macd_hist = pta.macd(dataframe['Close']).iloc[:,2]
-    dataframe['MACD'] = macd
-    dataframe['MACD_Signal'] = macd_signal
-    dataframe['MACD_Hist'] = macd_hist
-    dataframe = filter_data(dataframe, num_period)
+def MACD(dataframe, num_period, ticker=None):
+    macd = compute_indicators(dataframe['Close'], ('MACD_12_26_9',), ticker)
+    macd = macd.rename(columns={'MACD_12_26_9': 'MACD', 'MACDs_12_26_9': 'MACD_Signal', 'MACDh_12_26_9': 'MACD_Hist'})
+    dataframe = filter_data(macd, num_period)
     
     fig = go.Figure()
     
     # Add MACD line
     fig.add_trace(go.Scatter(
-        x=dataframe['Date'],
+        x=dataframe.index,
         y=dataframe['MACD'], 
         name='MACD', 
         line=dict(width=2.5, color='#2563eb'),
@@ -361,7 +734,7 @@ def MACD(dataframe, num_period):
     
     # Add Signal line
     fig.add_trace(go.Scatter(
-        x=dataframe['Date'],
+        x=dataframe.index,
         y=dataframe['MACD_Signal'], 
         name='Signal', 
         line=dict(width=2.5, color='#dc2626', dash='dash'),
@@ -371,7 +744,7 @@ def MACD(dataframe, num_period):
     # Add histogram bars with improved colors
     colors = ['#ef4444' if val < 0 else '#10b981' for val in dataframe['MACD_Hist']]
     fig.add_trace(go.Bar(
-        x=dataframe['Date'],
+        x=dataframe.index,
         y=dataframe['MACD_Hist'],
         name='Histogram',
         marker_color=colors,
@@ -486,4 +859,67 @@ def Moving_average_forecast(forecast):
         )
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+
+# Simulated portfolios drawn on the frontier chart (a random sample when there are more)
+FRONTIER_POINTS = 5000
+
+
+# Function to plot simulated portfolios (coloured by Sharpe ratio), the analytic efficient frontier,
+# the individual stocks and the highlighted portfolios, given as {name: (volatility, return)}
+
+def efficient_frontier_chart(simulation, frontier, mean, cov, highlights, max_points=FRONTIER_POINTS):
+    n = len(simulation['returns'])
+    pick = np.random.default_rng(0).choice(n, max_points, replace=False) if n > max_points else slice(None)
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=simulation['volatility'][pick],
+        y=simulation['returns'][pick],
+        mode='markers',
+        name='Simulated portfolios',
+        marker=dict(size=4, color=simulation['sharpe'][pick], colorscale='Viridis', showscale=True,
+                    colorbar=dict(title='Sharpe'), opacity=0.6),
+        hovertemplate='Volatility: %{x:.2f}%<br>Return: %{y:.2f}%<extra></extra>'
+    ))
+    fig.add_trace(go.Scatter(
+        x=frontier['volatility'],
+        y=frontier['return'],
+        mode='lines',
+        name='Efficient frontier',
+        line=dict(width=3, color='#1e293b'),
+        hovertemplate='Volatility: %{x:.2f}%<br>Return: %{y:.2f}%<extra></extra>'
+    ))
+    fig.add_trace(go.Scatter(
+        x=np.sqrt(np.diag(np.asarray(cov))),
+        y=np.asarray(mean),
+        mode='markers+text',
+        name='Stocks',
+        text=list(mean.index),
+        textposition='top center',
+        marker=dict(size=10, color='#64748b', symbol='diamond'),
+        hovertemplate='<b>%{text}</b><br>Volatility: %{x:.2f}%<br>Return: %{y:.2f}%<extra></extra>'
+    ))
+    for (name, (vol, ret)), color in zip(highlights.items(), ('#dc2626', '#16a34a', '#2563eb', '#f59e0b')):
+        fig.add_trace(go.Scatter(
+            x=[vol], y=[ret],
+            mode='markers',
+            name=name,
+            marker=dict(size=16, color=color, symbol='star', line=dict(width=1, color='white')),
+            hovertemplate=f'<b>{name}</b><br>Volatility: %{{x:.2f}}%<br>Return: %{{y:.2f}}%<extra></extra>'
+        ))
+
+    fig.update_xaxes(gridcolor='rgba(128,128,128,0.2)', title_text="Annualised volatility (%)", title_font_size=12)
+    fig.update_yaxes(gridcolor='rgba(128,128,128,0.2)', title_text="Expected annual return (%)", title_font_size=12)
+    fig.update_layout(
+        height=500,
+        plot_bgcolor='white',
+        paper_bgcolor='#f8fafc',
+        margin=dict(l=10, r=20, t=40, b=10),
+        title_text="Efficient Frontier",
+        title_font_size=16,
+        title_x=0.5,
+        legend=dict(orientation='h', yanchor='top', y=-0.15, xanchor='center', x=0.5)
+    )
+    return fig
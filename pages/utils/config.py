@@ -0,0 +1,5 @@
+# Settings shared across pages and utilities that belong to no single module
+
+# Tickers the app treats as its default set: fundamentals are prefetched for them and the prediction
+# page can backtest across them
+WATCHLIST = ('TSLA', 'AAPL', 'NFLX', 'MSFT', 'MGM', 'AMZN', 'NVDA', 'GOOGL')
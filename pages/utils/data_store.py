@@ -0,0 +1,275 @@
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from pages.utils.providers import OHLCV_COLUMNS, get_provider
+from pages.utils.singleflight import flights
+
+# Local OHLCV store: one directory per provider and ticker, one Parquet file per calendar year
+#
+#   <STORE_DIR>/yahoo/ohlcv/AAPL/1980.parquet
+#   <STORE_DIR>/yahoo/ohlcv/AAPL/...
+#   <STORE_DIR>/yahoo/ohlcv/AAPL/_meta.json
+
+STORE_DIR = os.environ.get(
+    'STOCK_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '.market_data'),
+)
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+MAX_AGE = datetime.timedelta(minutes=15)
+# Relative change of an already stored close that counts as a restatement
+RESTATEMENT_RTOL = 1e-4
+# Upper bound on concurrent downloads when fetching several tickers at once
+FETCH_WORKERS = 16
+
+def _ticker_dir(ticker):
+    return os.path.join(STORE_DIR, get_provider().name, 'ohlcv', ticker.upper().replace(os.sep, '_'))
+
+
+def _partition_path(ticker, year):
+    return os.path.join(_ticker_dir(ticker), f'{year}.parquet')
+
+
+def _stored_years(ticker):
+    path = _ticker_dir(ticker)
+    if not os.path.isdir(path):
+        return []
+    return sorted(int(name[:-8]) for name in os.listdir(path) if name.endswith('.parquet'))
+
+
+def _empty_frame():
+    return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype='float64')
+
+
+# Function to list the files of a directory ending in suffix, least recently written first. Files removed
+# by another writer while listing are left out.
+
+def files_by_mtime(directory, suffix):
+    files = []
+    for name in os.listdir(directory):
+        if name.endswith(suffix):
+            path = os.path.join(directory, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+    return [path for _, path in sorted(files)]
+
+
+# Function to keep only the `keep` most recently written files ending in suffix of a directory. Safe to
+# call from several writers at once: a file another writer already removed is skipped.
+
+def prune_files(directory, suffix, keep):
+    files = files_by_mtime(directory, suffix)
+    for path in files[:max(len(files) - keep, 0)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+
+
+# Function to download bars from the market data provider, either the full history or everything from `start` onwards
+
+def fetch_history(ticker, start=None):
+    return get_provider().history(ticker, start)
+
+
+def read_meta(ticker):
+    path = os.path.join(_ticker_dir(ticker), '_meta.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    meta['last_sync'] = datetime.datetime.fromisoformat(meta['last_sync'])
+    return meta
+
+
+def _write_meta(ticker, first, last, rows):
+    meta = {
+        'last_sync': datetime.datetime.now().isoformat(),
+        'first': first.isoformat() if first is not None else None,
+        'last': last.isoformat() if last is not None else None,
+        'rows': rows,
+    }
+    path = os.path.join(_ticker_dir(ticker), '_meta.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(path + '.tmp', path)
+
+
+def _write_partition(ticker, year, table):
+    path = _partition_path(ticker, year)
+    pq.write_table(table, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+# Function to write the bars of df into their yearly partitions; returns the years written.
+# The frame is converted to Arrow once and sliced per year.
+
+def _write_partitions(ticker, df):
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    years = df.index.year.to_numpy()
+    bounds = np.flatnonzero(np.diff(years)) + 1
+    for lo, hi in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(df)]])):
+        _write_partition(ticker, int(years[lo]), table.slice(lo, hi - lo))
+    return set(years.tolist())
+
+
+# Function to replace everything stored for a ticker with df
+
+def write_history(ticker, df):
+    os.makedirs(_ticker_dir(ticker), exist_ok=True)
+    years = _write_partitions(ticker, df)
+    for year in set(_stored_years(ticker)) - years:
+        os.remove(_partition_path(ticker, year))
+    _write_meta(ticker, df.index[0], df.index[-1], len(df))
+
+
+# Function to read stored bars in [start, end), only opening the partitions that overlap the range.
+# columns limits the read to some of the OHLCV columns (e.g. ['Close'] for bulk loads).
+
+def read_history(ticker, start=None, end=None, columns=None):
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    years = [y for y in _stored_years(ticker)
+             if (start is None or y >= start.year) and (end is None or y <= end.year)]
+    if not years:
+        return _empty_frame() if columns is None else _empty_frame()[columns]
+    tables = []
+    for y in years:
+        with pq.ParquetFile(_partition_path(ticker, y)) as f:
+            tables.append(f.read(columns=columns, use_pandas_metadata=True))
+    df = pa.concat_tables(tables).to_pandas()
+    if start is not None:
+        df = df[df.index >= start]
+    if end is not None:
+        df = df[df.index < end]
+    return df
+
+
+# Function to apply a split/dividend adjustment to the stored partitions before `year`.
+# Yahoo back-adjusts every bar before the event by one factor, so the stored bars can be
+# rescaled locally instead of downloading the whole history again.
+
+def _restate_partitions(ticker, year, price_factor, volume_factor):
+    for y in _stored_years(ticker):
+        if y >= year:
+            continue
+        part = pq.read_table(_partition_path(ticker, y)).to_pandas()
+        part[PRICE_COLUMNS] *= price_factor
+        part['Volume'] *= volume_factor
+        _write_partition(ticker, y, pa.Table.from_pandas(part, preserve_index=True))
+
+
+# Function to bring the stored history of a ticker up to date.
+# Only the bars from the last completed stored bar onwards are downloaded. That bar is compared with
+# the stored one to detect a restatement caused by a new split or dividend; the last stored bar may
+# have been a partial intraday bar, so it is always overwritten rather than compared.
+
+def sync_history(ticker):
+    meta = read_meta(ticker)
+    if meta is None or meta['last'] is None:
+        df = fetch_history(ticker)
+        if len(df):
+            write_history(ticker, df)
+        return
+
+    last = pd.Timestamp(meta['last'])
+    current = read_history(ticker, start=datetime.datetime(last.year, 1, 1))
+    if len(current) < 2:
+        # the bar before the last one is in the previous year's partition
+        current = read_history(ticker, start=datetime.datetime(last.year - 1, 1, 1))
+    if len(current) < 2:
+        write_history(ticker, fetch_history(ticker))
+        return
+    # the last completed bar; rewrite from the start of its year so whole partitions are written
+    anchor = current.index[-2]
+    current = current[current.index >= datetime.datetime(anchor.year, 1, 1)]
+
+    tail = fetch_history(ticker, start=anchor)
+    if len(tail) == 0:
+        _write_meta(ticker, pd.Timestamp(meta['first']), last, meta['rows'])
+        return
+    if anchor not in tail.index:
+        write_history(ticker, fetch_history(ticker))
+        return
+
+    ratio = tail.at[anchor, 'Close'] / current.at[anchor, 'Close']
+    if not np.isclose(ratio, 1.0, rtol=RESTATEMENT_RTOL):
+        events = tail[tail.index > anchor]
+        has_split = (events['Stock Splits'] != 0).any()
+        has_dividend = (events['Dividends'] != 0).any()
+        if not (has_split or has_dividend):
+            # restated without a corporate action we can explain, start over
+            write_history(ticker, fetch_history(ticker))
+            return
+        volume_factor = events['Stock Splits'].replace(0, 1).prod() if has_split else 1.0
+        _restate_partitions(ticker, anchor.year, ratio, volume_factor)
+        current[PRICE_COLUMNS] *= ratio
+        current['Volume'] *= volume_factor
+
+    merged = pd.concat([current[current.index < anchor], tail])
+    _write_partitions(ticker, merged)
+    _write_meta(ticker, pd.Timestamp(meta['first']), merged.index[-1], meta['rows'] - len(current) + len(merged))
+
+
+def _sync_if_stale(ticker, max_age):
+    meta = read_meta(ticker)
+    if meta is None or datetime.datetime.now() - meta['last_sync'] > max_age:
+        try:
+            sync_history(ticker)
+        except Exception:
+            # provider unreachable or failing: serve the stored bars, if there are any
+            if meta is None or meta['last'] is None:
+                raise
+
+
+# Function to get daily OHLCV bars for a ticker through the local store.
+# The network is only used when the last sync is older than max_age, and then only for the missing tail.
+# Concurrent calls for the same ticker share one sync, so a ticker is never written by two threads at once.
+
+def get_history(ticker, start=None, end=None, max_age=MAX_AGE, columns=None):
+    ticker = ticker.upper()
+    flights.do(('history', get_provider().name, ticker), _sync_if_stale, ticker, max_age)
+    return read_history(ticker, start, end, columns)
+
+
+# Function to get a FRED series (e.g. the sp500 benchmark) indexed by Date
+
+def get_fred_series(name, start=None, end=None):
+    return get_provider().series(name, start, end)
+
+
+# Function to fetch the closes of several tickers and an optional FRED benchmark concurrently.
+# Returns a dict of Close series (in ticker order) and the benchmark frame (None without a benchmark).
+# With errors='skip', tickers that fail to load are left out instead of raising.
+
+def fetch_closes(tickers, start=None, end=None, benchmark='sp500', max_workers=FETCH_WORKERS, errors='raise'):
+    tickers = list(dict.fromkeys(tickers))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers) + 1))) as pool:
+        bench = pool.submit(get_fred_series, benchmark, start, end) if benchmark else None
+        futures = {t: pool.submit(get_history, t, start, end, columns=['Close']) for t in tickers}
+        closes = {}
+        for t, f in futures.items():
+            try:
+                closes[t] = f.result()['Close']
+            except Exception:
+                if errors != 'skip':
+                    raise
+        return closes, bench.result() if bench is not None else None
+
+
+# Function to fetch the closes of several tickers and an optional FRED benchmark as one wide frame,
+# with a column per ticker (plus the benchmark), aligned on the dates the benchmark has
+
+def get_close_panel(tickers, start=None, end=None, benchmark='sp500', max_workers=FETCH_WORKERS, errors='raise'):
+    closes, bench = fetch_closes(tickers, start, end, benchmark, max_workers, errors)
+    panel = pd.DataFrame(closes, columns=list(closes))
+    panel.index.name = 'Date'
+    if bench is not None:
+        panel = panel.join(bench, how='inner')
+    return panel
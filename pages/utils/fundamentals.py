@@ -0,0 +1,119 @@
+import os
+import json
+import threading
+import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pages.utils.config import WATCHLIST
+from pages.utils.data_store import STORE_DIR, FETCH_WORKERS
+from pages.utils.providers import get_provider
+from pages.utils.singleflight import flights
+
+# Snapshot cache for yf.Ticker(...).info.
+# Only the fields the app displays are kept, in an LRU memory tier backed by one JSON file per ticker:
+#
+#   <STORE_DIR>/yahoo/fundamentals/AAPL.json
+
+INFO_FIELDS = (
+    'longBusinessSummary', 'sector', 'industry', 'website',
+    'marketCap', 'previousClose', 'open', 'dayHigh', 'fiftyTwoWeekHigh',
+    'volume', 'beta', 'dividendYield',
+    'trailingPE', 'forwardPE', 'trailingEps', 'forwardEps', 'priceToSalesTrailing12Months',
+    'priceToBook', 'currentRatio', 'debtToEquity',
+)
+INFO_TTL = datetime.timedelta(hours=24)
+MEMORY_SIZE = 256
+
+# keyed by (provider name, ticker)
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def _snapshot_path(ticker):
+    return os.path.join(STORE_DIR, get_provider().name, 'fundamentals', ticker.replace(os.sep, '_') + '.json')
+
+
+def _remember(key, snapshot):
+    with _memory_lock:
+        _memory[key] = snapshot
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+def _recall(key):
+    with _memory_lock:
+        snapshot = _memory.get(key)
+        if snapshot is not None:
+            _memory.move_to_end(key)
+        return snapshot
+
+
+def _read_snapshot(ticker):
+    path = _snapshot_path(ticker)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        snapshot = json.load(f)
+    snapshot['fetched'] = datetime.datetime.fromisoformat(snapshot['fetched'])
+    return snapshot
+
+
+def _write_snapshot(ticker, snapshot):
+    path = _snapshot_path(ticker)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'fetched': snapshot['fetched'].isoformat(), 'info': snapshot['info']}, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+
+def fetch_info(ticker):
+    info = get_provider().info(ticker)
+    return {field: info.get(field) for field in INFO_FIELDS}
+
+
+def _load_snapshot(key, ticker, max_age):
+    snapshot = _read_snapshot(ticker)
+    if snapshot is None or datetime.datetime.now() - snapshot['fetched'] > max_age:
+        snapshot = {'fetched': datetime.datetime.now(), 'info': fetch_info(ticker)}
+        _write_snapshot(ticker, snapshot)
+    _remember(key, snapshot)
+    return snapshot
+
+
+# Function to get the fundamentals snapshot of a ticker, fetching it only when both tiers are older than max_age
+
+def get_info(ticker, max_age=INFO_TTL):
+    ticker = ticker.upper()
+    key = (get_provider().name, ticker)
+    snapshot = _recall(key)
+    if snapshot is None or datetime.datetime.now() - snapshot['fetched'] > max_age:
+        snapshot = flights.do(('info',) + key, _load_snapshot, key, ticker, max_age)
+    return snapshot['info']
+
+
+# Function to warm the cache for a whole watchlist; tickers that fail to load are skipped
+
+def prefetch_info(tickers=WATCHLIST, max_age=INFO_TTL, max_workers=FETCH_WORKERS):
+    def load(ticker):
+        try:
+            return get_info(ticker, max_age)
+        except Exception:
+            return None
+
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as pool:
+        infos = dict(zip(tickers, pool.map(load, tickers)))
+    return {t: info for t, info in infos.items() if info is not None}
+
+
+# held for the life of the process once the prefetch has started
+_prefetch_lock = threading.Lock()
+
+
+# Function to run prefetch_info once per process on a background thread; concurrent sessions race
+# for the lock without waiting, so exactly one of them starts it
+
+def start_prefetch(tickers=WATCHLIST):
+    if _prefetch_lock.acquire(blocking=False):
+        threading.Thread(target=prefetch_info, args=(tickers,), daemon=True).start()
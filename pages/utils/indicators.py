@@ -0,0 +1,244 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pages.utils.providers import get_provider
+from pages.utils.streaming import STREAMING_CLASSES, from_state
+
+# Technical indicator engine. A requested set of indicators is computed together over one close
+# series, sharing intermediates (price diffs, SMAs, EMAs), and returned as one read-only block.
+# Names follow pandas_ta and the values match its defaults:
+#
+#   RSI_<n>              RSI_14
+#   SMA_<n>              SMA_50
+#   EMA_<n>              EMA_20
+#   MACD_<f>_<s>_<g>     MACD_12_26_9, MACDh_12_26_9, MACDs_12_26_9
+#   BBANDS_<n>_<k>       BBL_20_2, BBM_20_2, BBU_20_2
+#
+# Cached blocks also keep the streaming state (pages.utils.streaming) of every indicator as of the
+# second-to-last bar, so when bars are appended or the last bar is revised only the new rows are computed.
+
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _parse(name):
+    kind, *params = name.split('_')
+    return kind.upper(), tuple(int(p) for p in params)
+
+
+def output_columns(name):
+    kind, params = _parse(name)
+    if kind == 'MACD':
+        suffix = '_'.join(str(p) for p in params)
+        return [f'MACD_{suffix}', f'MACDh_{suffix}', f'MACDs_{suffix}']
+    if kind == 'BBANDS':
+        suffix = '_'.join(str(p) for p in params)
+        return [f'BBL_{suffix}', f'BBM_{suffix}', f'BBU_{suffix}']
+    if kind in ('RSI', 'SMA', 'EMA'):
+        return [name]
+    raise ValueError(f'Unknown indicator: {name}')
+
+
+class _Intermediates:
+
+    def __init__(self, close):
+        self.close = close
+        self._sma = {}
+        self._ema = {}
+        self._diff = None
+        self.rsi_averages = {}
+
+    def diff(self):
+        if self._diff is None:
+            self._diff = self.close.diff()
+        return self._diff
+
+    def sma(self, length):
+        if length not in self._sma:
+            self._sma[length] = self.close.rolling(length, min_periods=length).mean()
+        return self._sma[length]
+
+    def ema(self, length):
+        if length not in self._ema:
+            self._ema[length] = ema(self.close, length)
+        return self._ema[length]
+
+
+# Function for a pandas_ta style EMA: seeded with the SMA of the first `length` values, then recursive
+
+def ema(series, length):
+    if len(series) < length:
+        return pd.Series(np.nan, index=series.index)
+    seeded = series.copy()
+    seeded.iloc[:length - 1] = np.nan
+    seeded.iloc[length - 1] = series.iloc[:length].mean()
+    return seeded.ewm(span=length, adjust=False).mean()
+
+
+def _rsi(shared, length):
+    diff = shared.diff()
+    gain = diff.clip(lower=0)
+    loss = diff.clip(upper=0).abs()
+    avg_gain = gain.ewm(alpha=1.0 / length).mean()
+    avg_loss = loss.ewm(alpha=1.0 / length).mean()
+    shared.rsi_averages[length] = (avg_gain, avg_loss)
+    rsi = 100 * avg_gain / (avg_gain + avg_loss)
+    # same as min_periods=length: the first `length` prices give fewer than `length` changes
+    rsi.iloc[:length] = np.nan
+    return rsi
+
+
+def _macd(shared, fast, slow, signal):
+    macd = shared.ema(fast) - shared.ema(slow)
+    first = macd.first_valid_index()
+    signal_line = ema(macd.loc[first:], signal).reindex(macd.index)
+    return [macd, macd - signal_line, signal_line]
+
+
+def _bbands(shared, length, width):
+    mid = shared.sma(length)
+    std = shared.close.rolling(length, min_periods=length).std(ddof=0)
+    return [mid - width * std, mid, mid + width * std]
+
+
+def _ema_state(close, length, ema_values, p):
+    return {'kind': 'EMA', 'length': length, 'count': p,
+            'seed_total': float(np.sum(close[:min(length, p)])), 'value': float(ema_values[p - 1])}
+
+
+# Function to build the streaming state of one indicator after its first p bars, from the batch results
+
+def _state(shared, name, result, p):
+    kind, params = _parse(name)
+    close = shared.close.to_numpy(dtype='float64')
+    if kind == 'SMA':
+        (length,) = params
+        window = np.full(length, np.nan)
+        tail = close[max(0, p - length):p]
+        window[length - len(tail):] = tail
+        return {'kind': 'SMA', 'length': length, 'count': p, 'window': window.tolist()}
+    if kind == 'EMA':
+        return _ema_state(close, params[0], result[0], p)
+    if kind == 'RSI':
+        (length,) = params
+        count = p - 1
+        decay = 1.0 - 1.0 / length
+        weight = (1 - decay ** count) / (1 - decay)
+        avg_gain, avg_loss = shared.rsi_averages[length]
+        gain = float(avg_gain.iloc[p - 1]) * weight if count else 0.0
+        loss = float(avg_loss.iloc[p - 1]) * weight if count else 0.0
+        return {'kind': 'RSI', 'length': length, 'count': count, 'prev': float(close[p - 1]), 'gain': gain, 'loss': loss}
+    if kind == 'MACD':
+        fast, slow, signal = params
+        macd = result[0][:p]
+        valid = macd[~np.isnan(macd)]
+        return {
+            'kind': 'MACD',
+            'fast': _ema_state(close, fast, shared.ema(fast).to_numpy(), p),
+            'slow': _ema_state(close, slow, shared.ema(slow).to_numpy(), p),
+            'signal': _ema_state(valid, signal, result[2][:p][~np.isnan(macd)], len(valid)) if len(valid) else
+                      {'kind': 'EMA', 'length': signal, 'count': 0, 'seed_total': 0.0, 'value': np.nan},
+            'value': [float(r[p - 1]) for r in result],
+        }
+
+
+def _compute(close, indicators):
+    shared = _Intermediates(close)
+    columns, values = [], []
+    results = {}
+    for name in indicators:
+        kind, params = _parse(name)
+        if kind == 'RSI':
+            result = [_rsi(shared, *params)]
+        elif kind == 'SMA':
+            result = [shared.sma(*params)]
+        elif kind == 'EMA':
+            result = [shared.ema(*params)]
+        elif kind == 'MACD':
+            result = _macd(shared, *params)
+        elif kind == 'BBANDS':
+            result = _bbands(shared, *params)
+        else:
+            raise ValueError(f'Unknown indicator: {name}')
+        columns += output_columns(name)
+        results[name] = [r.to_numpy(dtype='float64') for r in result]
+        values += results[name]
+
+    block = np.column_stack(values) if values else np.empty((len(close), 0))
+    block.flags.writeable = False
+    block = pd.DataFrame(block, index=close.index, columns=columns, copy=False)
+
+    states = None
+    streamable = all(_parse(name)[0] in STREAMING_CLASSES for name in indicators)
+    if streamable and len(close) >= 2 and not close.isna().any():
+        p = len(close) - 1
+        states = {name: _state(shared, name, results[name], p) for name in indicators}
+    return block, states
+
+
+def _stream_rows(streams, indicators, values):
+    rows = []
+    for x in values:
+        row = []
+        for name in indicators:
+            out = streams[name].update(float(x))
+            row += list(out) if isinstance(out, tuple) else [out]
+        rows.append(row)
+    return rows
+
+
+# Function to bring a cached entry up to date with close by streaming only the bars after its
+# committed state. Returns None when the history before those bars changed (e.g. a restatement).
+
+def _extend(entry, close, indicators):
+    block, p = entry['block'], entry['p']
+    if len(close) == len(block) and close.index[-1] == block.index[-1] and close.iloc[-1] == entry['last']:
+        return block
+    if (entry['states'] is None or len(close) <= p or close.index[0] != block.index[0]
+            or close.index[p - 1] != block.index[p - 1] or close.iloc[p - 1] != entry['anchor']):
+        return None
+
+    values = close.to_numpy(dtype='float64')
+    streams = {name: from_state(state) for name, state in entry['states'].items()}
+    rows = _stream_rows(streams, indicators, values[p:-1])
+    states = {name: stream.state() for name, stream in streams.items()}
+    rows += _stream_rows(streams, indicators, values[-1:])
+
+    data = np.vstack([block.to_numpy()[:p], np.array(rows, dtype='float64').reshape(len(rows), block.shape[1])])
+    data.flags.writeable = False
+    block = pd.DataFrame(data, index=close.index, columns=block.columns, copy=False)
+    entry.update(block=block, states=states, p=len(close) - 1, anchor=values[-2], last=values[-1])
+    return block
+
+
+# Function to compute a set of indicators over a close series in one go.
+# With a ticker, results are cached per (provider, ticker, indicators) and kept up to date incrementally;
+# the returned frame is read-only and shared between callers, so add columns to a copy rather than writing
+# into it.
+
+def compute_indicators(close, indicators=('RSI_14', 'SMA_20', 'SMA_50', 'MACD_12_26_9'), ticker=None):
+    close = pd.Series(close, dtype='float64')
+    indicators = tuple(indicators)
+    if ticker is None or len(close) < 2:
+        return _compute(close, indicators)[0]
+
+    key = (get_provider().name, ticker.upper(), indicators)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            block = _extend(entry, close, indicators)
+            if block is not None:
+                return block
+
+    block, states = _compute(close, indicators)
+    values = close.to_numpy(dtype='float64')
+    entry = {'block': block, 'states': states, 'p': len(close) - 1, 'anchor': values[-2], 'last': values[-1]}
+    with _cache_lock:
+        _cache[key] = entry
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return block
@@ -1,56 +1,130 @@
-import yfinance as yf
+import threading
+from collections import OrderedDict
 from statsmodels.tsa.stattools import adfuller
 from sklearn.metrics import mean_squared_error
-from statsmodels.tsa.arima.model import ARIMA
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 from datetime import datetime, timedelta
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.linalg import solve_toeplitz
+from pages.utils.data_store import get_history
+from pages.utils.model_cache import fingerprint, fit_arima
 
 def get_data(ticker):
-    stock_data = yf.download(ticker, start='2024-01-01')
+    stock_data = get_history(ticker, start='2024-01-01')
     return stock_data['Close']
 
-def stationary_check(close_price):
-    adf_test = adfuller(close_price)
-    p_value = round(adf_test[1], 3)
-    return p_value
+# ADF results are memoized by series fingerprint (and lag), so an unchanged series is never tested twice.
+# The lag picked for a ticker's series at each differencing level is remembered as well: with reuse_lag,
+# a series that only appends bars to the last one tested (or is that series again) is run at that lag
+# instead of searching them all, and its result is looked up under that lag.
+ADF_CACHE_SIZE = 256
+
+_adf_cache = OrderedDict()
+_adf_last = {}
+_adf_lock = threading.Lock()
+
+def _adf_lookup(key):
+    with _adf_lock:
+        result = _adf_cache.get(key)
+        if result is not None:
+            _adf_cache.move_to_end(key)
+        return result
+
+def stationary_check(close_price, ticker=None, level=0, reuse_lag=False):
+    digest = fingerprint(close_price)
+    values = np.asarray(close_price, dtype='float64').reshape(-1)
+    last = _adf_last.get((ticker.upper(), level)) if ticker else None
+    lag = None
+    if reuse_lag and last is not None and len(last[0]) <= len(values) and np.array_equal(values[:len(last[0])], last[0]):
+        lag = last[1]
+    # the result at the reused lag comes first, so the same series always gets the same answer
+    result = _adf_lookup((digest, lag)) if lag is not None else None
+    if result is None:
+        result = _adf_lookup((digest, None))
+    if result is None:
+        adf_test = adfuller(values) if lag is None else adfuller(values, maxlag=lag, autolag=None)
+        result = (round(adf_test[1], 3), adf_test[2])
+        with _adf_lock:
+            _adf_cache[(digest, lag)] = result
+            while len(_adf_cache) > ADF_CACHE_SIZE:
+                _adf_cache.popitem(last=False)
+    if ticker:
+        with _adf_lock:
+            _adf_last[(ticker.upper(), level)] = (values, result[1])
+    return result[0]
 
 def get_rolling_mean(close_price):
     rolling_price = close_price.rolling(window=7).mean().dropna()
     return rolling_price
 
-def get_differencing_order(close_price):
-    p_value = stationary_check(close_price)
+def get_differencing_order(close_price, ticker=None, reuse_lag=False):
+    p_value = stationary_check(close_price, ticker, 0, reuse_lag)
     d = 0
     while True:
         if p_value > 0.05:
           d +=1
           close_price = close_price.diff().dropna()
-          p_value = stationary_check(close_price)
+          p_value = stationary_check(close_price, ticker, d, reuse_lag)
         else:
           break
     return d
 
+ENGINES = ('arima', 'fast')
 
-def fit_model(data, differencing_order):
-    model = ARIMA(data, order=(30, differencing_order, 1))
-    model_fit = model.fit()
-    
-    forecast_steps = 30
-    forecast = model_fit.get_forecast(steps=forecast_steps)
-    
-    predictions = forecast.predicted_mean
-    return predictions
+# Fast engine: AR(p) on the d times differenced series, fitted in NumPy by least squares or Yule-Walker
+# and forecast recursively, then integrated back. No MA term and no likelihood, but a fit takes well
+# under a millisecond instead of seconds. Like statsmodels' ARIMA, it fits a mean only when d = 0.
+# Lags are capped at a quarter of the series, so short windows (e.g. evaluate_model's 30 bars) still
+# leave about three equations per coefficient.
+def fast_ar_forecast(data, differencing_order, lags=30, steps=30, method='ls'):
+    levels = [np.asarray(data, dtype='float64').reshape(-1)]
+    for _ in range(differencing_order):
+        levels.append(np.diff(levels[-1]))
+    x = levels[-1]
+    mean = x.mean() if differencing_order == 0 else 0.0
+    x = x - mean
+    lags = min(lags, len(x) // 4)
+
+    if lags == 0:
+        coef = np.zeros(0)
+    elif method == 'ls':
+        # row t holds x[t + lags - 1], ..., x[t], the lags of x[t + lags]
+        windows = sliding_window_view(x, lags)[:-1, ::-1]
+        coef = np.linalg.lstsq(windows, x[lags:], rcond=None)[0]
+    elif method == 'yw':
+        acov = np.array([x[:len(x) - k] @ x[k:] for k in range(lags + 1)]) / len(x)
+        coef = solve_toeplitz(acov[:-1], acov[1:])
+    else:
+        raise ValueError("method must be 'ls' or 'yw'")
+
+    path = np.concatenate([x[len(x) - lags:], np.zeros(steps)])
+    for step in range(steps):
+        path[lags + step] = coef @ path[step:lags + step][::-1]
+    forecast = path[lags:] + mean
+    # undo the differencing, one level at a time
+    for level in reversed(levels[:-1]):
+        forecast = level[-1] + np.cumsum(forecast)
+    return forecast
+
+# Fits are cached per ticker, data and order (pages.utils.model_cache), so unchanged data is never refitted.
+# The order defaults to (30, d, 1); pages.utils.order_search picks one by AIC/BIC instead.
+# The fast engine fits AR(p) with the order's p and d and ignores q.
+def fit_model(data, differencing_order, ticker=None, order=None, engine='arima'):
+    order = order or (30, differencing_order, 1)
+    if engine == 'fast':
+        return fast_ar_forecast(data, order[1], order[0])
+    return fit_arima(data, order, ticker).forecast
 
-def evaluate_model(original_price, differencing_order):
+def evaluate_model(original_price, differencing_order, ticker=None, order=None, engine='arima'):
     # Use last 60 samples: first 30 for training, next 30 for testing
     if len(original_price) < 60:
         return 0.0  # Not enough data
     
     train_data = original_price[-60:-30]
     test_data = original_price[-30:]
-    predictions = fit_model(train_data, differencing_order)
+    predictions = fit_model(train_data, differencing_order, ticker, order, engine)
     rmse = np.sqrt(mean_squared_error(test_data, predictions))
     return round(rmse, 2)
 
@@ -59,8 +133,8 @@ def scaling(close_price):
     scaled_data = scaler.fit_transform(np.array(close_price).reshape(-1, 1))
     return scaled_data, scaler
 
-def get_forecast(original_price, differencing_order):
-    predictions = fit_model(original_price, differencing_order)
+def get_forecast(original_price, differencing_order, ticker=None, order=None, engine='arima'):
+    predictions = fit_model(original_price, differencing_order, ticker, order, engine)
     # Ensure the forecast index starts from the day after the last date in the input series
     if hasattr(original_price, 'index'):
         last_date = original_price.index[-1]
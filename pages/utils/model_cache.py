@@ -0,0 +1,298 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+from pages.utils.data_store import STORE_DIR, files_by_mtime, prune_files
+from pages.utils.singleflight import flights
+
+# Fitted ARIMA cache. A fit is stored as its parameters plus the series it was fitted on (from which
+# the full statsmodels results are rebuilt with one Kalman filter pass, no optimisation), together
+# with its fit statistics, forecast and the Kalman filter state after the last observation. Entries
+# are keyed by ticker, a fingerprint of the series and the (p, d, q) order, and kept in an
+# in-process LRU in front of one .npz file per fit:
+#
+#   <STORE_DIR>/models/AAPL/<fingerprint>_30-1-1.npz
+#
+# When a series is not cached but extends a cached one (new bars appended, possibly after the whole
+# series was rescaled, as the prediction page's standard scaling does every day), a RefitPolicy picks:
+#
+#   append   filter only the new bars from the stored state with the cached parameters (milliseconds)
+#   warm     re-estimate, starting the optimiser from the cached parameters
+#   cold     re-estimate from the default start parameters
+
+MODEL_DIR = os.path.join(STORE_DIR, 'models')
+FORECAST_STEPS = 30
+MEMORY_SIZE = 64
+# Fits kept on disk per ticker; the least recently written are removed first
+DISK_SIZE = 20
+# Largest deviation (relative to the series' scale) for a cached series to count as a rescaled prefix
+AFFINE_TOL = 1e-9
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+# Function to fingerprint a series by its values (and dates, if it has them)
+
+def fingerprint(data):
+    h = hashlib.sha1(np.ascontiguousarray(np.asarray(data, dtype='float64')).tobytes())
+    if isinstance(getattr(data, 'index', None), pd.DatetimeIndex):
+        h.update(data.index.asi8.tobytes())
+    return h.hexdigest()
+
+
+# Decides how to bring a cached fit up to date with new bars. Parameters are treated as stable, and
+# new bars are only filtered, until more than max_appended bars have been appended since the last
+# estimation or a new bar's standardized one-step forecast error exceeds max_surprise. Every
+# max_refits warm refits in a row, a cold one guards against drifting into a poor local optimum.
+
+class RefitPolicy:
+
+    def __init__(self, max_appended=5, max_surprise=4.0, max_refits=20):
+        self.max_appended = max_appended
+        self.max_surprise = max_surprise
+        self.max_refits = max_refits
+
+    # previous is the cached fit to start from (None if there is none); new_bars is how many bars the
+    # series adds to it, None when the series does not extend it
+    def decide(self, previous, new_bars=None, surprise=0.0):
+        if previous is None or previous.refits >= self.max_refits:
+            return 'cold'
+        if (new_bars is not None and previous.appended + new_bars <= self.max_appended
+                and surprise <= self.max_surprise):
+            return 'append'
+        return 'warm'
+
+
+DEFAULT_POLICY = RefitPolicy()
+
+
+class FittedARIMA:
+
+    def __init__(self, order, params, param_names, endog, llf, aic, bic, forecast, state, state_cov, burn,
+                 appended=0, refits=0, method='cold'):
+        self.order = tuple(int(o) for o in order)
+        self.params = np.asarray(params, dtype='float64')
+        self.param_names = list(param_names)
+        self.endog = np.asarray(endog, dtype='float64')
+        self.llf = float(llf)
+        self.aic = float(aic)
+        self.bic = float(bic)
+        self.forecast = np.asarray(forecast, dtype='float64')
+        # predicted state (and covariance) for the bar after the last one, and the leading bars
+        # left out of the log-likelihood
+        self.state = np.asarray(state, dtype='float64')
+        self.state_cov = np.asarray(state_cov, dtype='float64')
+        self.burn = int(burn)
+        # bars appended since the parameters were estimated, warm refits since the last cold fit,
+        # and how this fit was produced ('cold', 'warm' or 'append')
+        self.appended = int(appended)
+        self.refits = int(refits)
+        self.method = str(method)
+
+    @classmethod
+    def from_results(cls, results, steps=FORECAST_STEPS, refits=0, method='cold'):
+        return cls(results.model.order, results.params, results.param_names, results.model.endog[:, 0],
+                   results.llf, results.aic, results.bic, np.asarray(results.get_forecast(steps=steps).predicted_mean),
+                   results.predicted_state[:, -1], results.predicted_state_cov[:, :, -1],
+                   results.loglikelihood_burn, 0, refits, method)
+
+    # Parameters, state and log-likelihood of this fit for the series rescaled to a * endog + b
+    def rescaled(self, a, b):
+        params = self.params.copy()
+        params[self.param_names.index('sigma2')] *= a * a
+        if 'const' in self.param_names:
+            i = self.param_names.index('const')
+            params[i] = a * params[i] + b
+        state = a * self.state
+        if self.order[1] >= 1:
+            # the first state is the last undifferenced value; differences do not see the shift
+            state[0] += b
+        llf = self.llf - (len(self.endog) - self.burn) * np.log(abs(a))
+        return params, state, a * a * self.state_cov, llf
+
+    # Function to extend this fit (whose series, rescaled to a * endog + b, is the start of `values`)
+    # with the remaining bars without re-estimating. Returns the new fit and the largest absolute
+    # standardized one-step forecast error among the new bars.
+    def append(self, values, a=1.0, b=0.0, steps=FORECAST_STEPS):
+        params, state, state_cov, llf = self.rescaled(a, b)
+        k = len(params)
+        if len(values) == len(self.endog):
+            # only rescaled: so are the forecasts
+            return FittedARIMA(self.order, params, self.param_names, values, llf, 2 * k - 2 * llf,
+                               k * np.log(len(values) - self.burn) - 2 * llf, a * self.forecast + b,
+                               state, state_cov, self.burn, self.appended, self.refits, 'append'), 0.0
+        model = ARIMA(values[len(self.endog):], order=self.order)
+        model.ssm.initialize_known(state, state_cov)
+        model.ssm.loglikelihood_burn = 0
+        results = model.filter(params)
+        llf += results.llf
+        fitted = FittedARIMA(self.order, params, self.param_names, values, llf, 2 * k - 2 * llf,
+                             k * np.log(len(values) - self.burn) - 2 * llf,
+                             np.asarray(results.get_forecast(steps=steps).predicted_mean),
+                             results.predicted_state[:, -1], results.predicted_state_cov[:, :, -1], self.burn,
+                             self.appended + len(values) - len(self.endog), self.refits, 'append')
+        return fitted, np.nanmax(np.abs(results.standardized_forecasts_error))
+
+    # Function to rebuild the full statsmodels results (for other forecasts, diagnostics, ...)
+    def results(self):
+        return ARIMA(self.endog, order=self.order).filter(self.params)
+
+    def save(self, path):
+        # written through a file object so numpy does not add .npz to the temporary name, which would
+        # make it look like a finished fit to the pruning of concurrent writers; one per writer, as two
+        # sessions can store the same fit at once
+        tmp = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, order=self.order, params=self.params, param_names=np.array(self.param_names),
+                     endog=self.endog, stats=[self.llf, self.aic, self.bic], forecast=self.forecast,
+                     state=self.state, state_cov=self.state_cov, counts=[self.burn, self.appended, self.refits],
+                     method=self.method)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            llf, aic, bic = f['stats']
+            burn, appended, refits = f['counts']
+            return cls(f['order'], f['params'], f['param_names'].tolist(), f['endog'], llf, aic, bic, f['forecast'],
+                       f['state'], f['state_cov'], burn, appended, refits, f['method'].item())
+
+
+def _key(ticker, data, order):
+    return ((ticker or '_').upper(), fingerprint(data), tuple(int(o) for o in order))
+
+
+def _path(key):
+    ticker, digest, order = key
+    return os.path.join(MODEL_DIR, ticker.replace(os.sep, '_'), f"{digest}_{'-'.join(map(str, order))}.npz")
+
+
+def _remember(key, fitted):
+    with _memory_lock:
+        _memory[key] = fitted
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+# Function to get a cached fit from memory or disk; None when the series and order were never fitted
+
+def lookup(ticker, data, order):
+    key = _key(ticker, data, order)
+    with _memory_lock:
+        fitted = _memory.get(key)
+        if fitted is not None:
+            _memory.move_to_end(key)
+            return fitted
+    path = _path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        fitted = FittedARIMA.load(path)
+    except (OSError, ValueError, KeyError):
+        # unreadable (e.g. partially written by an older version): fit again
+        return None
+    _remember(key, fitted)
+    return fitted
+
+
+def store(ticker, data, order, fitted):
+    key = _key(ticker, data, order)
+    _remember(key, fitted)
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fitted.save(path)
+    prune_files(os.path.dirname(path), '.npz', DISK_SIZE)
+
+
+# (a, b) such that new starts with a * old + b, or None
+
+def _affine_prefix(old, new):
+    m = len(old)
+    if m < 2 or m > len(new):
+        return None
+    head = new[:m]
+    if np.array_equal(head, old):
+        return 1.0, 0.0
+    spread = old.std()
+    if spread == 0:
+        return None
+    a = np.copysign(head.std() / spread, np.dot(old - old.mean(), head - head.mean()))
+    b = head.mean() - a * old.mean()
+    if a == 0 or np.abs(a * old + b - head).max() > AFFINE_TOL * max(1.0, np.abs(head).max()):
+        return None
+    return a, b
+
+
+# Cached fits of a ticker with the given order, most recent first
+
+def _related(ticker, order):
+    ticker = (ticker or '_').upper()
+    order = tuple(int(o) for o in order)
+    with _memory_lock:
+        fits = [fitted for key, fitted in reversed(_memory.items()) if key[0] == ticker and key[2] == order]
+    directory = os.path.join(MODEL_DIR, ticker.replace(os.sep, '_'))
+    suffix = f"_{'-'.join(map(str, order))}.npz"
+    if os.path.isdir(directory):
+        for path in reversed(files_by_mtime(directory, suffix)):
+            try:
+                fits.append(FittedARIMA.load(path))
+            except (OSError, ValueError, KeyError):
+                continue
+    return fits
+
+
+def _estimate(values, order, previous=None, start_params=None):
+    if previous is None:
+        return FittedARIMA.from_results(ARIMA(values, order=order).fit())
+    results = ARIMA(values, order=order).fit(start_params=start_params)
+    return FittedARIMA.from_results(results, refits=previous.refits + 1, method='warm')
+
+
+# Function to fit a series given earlier fits of the same model (most recent first), without the
+# cache: the longest fit the series extends is brought up to date as the policy decides; otherwise
+# the most recent one (e.g. of yesterday's evaluation window) is still a good place to start the
+# optimiser from.
+
+def update_fit(values, order, related=(), policy=DEFAULT_POLICY):
+    values = np.asarray(values, dtype='float64').reshape(-1)
+    for previous in sorted(related, key=lambda f: len(f.endog), reverse=True):
+        scale = _affine_prefix(previous.endog, values)
+        if scale is None:
+            continue
+        a, b = scale
+        appended, surprise = previous.append(values, a, b)
+        decision = policy.decide(previous, len(values) - len(previous.endog), surprise)
+        if decision == 'append':
+            return appended
+        if decision == 'warm':
+            return _estimate(values, order, previous, previous.rescaled(a, b)[0])
+        return _estimate(values, order)
+
+    previous = related[0] if related else None
+    if policy.decide(previous) == 'warm':
+        return _estimate(values, order, previous, previous.params)
+    return _estimate(values, order)
+
+
+def _fit(ticker, data, order, policy):
+    fitted = lookup(ticker, data, order)
+    if fitted is None:
+        fitted = update_fit(data, order, _related(ticker, order), policy)
+        store(ticker, data, order, fitted)
+    return fitted
+
+
+# Function to get the ARIMA fit of a series. Cached fits are returned as they are; otherwise the
+# policy decides between extending, warm-refitting or cold-fitting from the related cached fits.
+# Concurrent calls for the same ticker, series and order share one fit.
+
+def fit_arima(data, order, ticker=None, policy=DEFAULT_POLICY):
+    fitted = lookup(ticker, data, order)
+    if fitted is not None:
+        return fitted
+    return flights.do(('fit',) + _key(ticker, data, order), _fit, ticker, data, order, policy)
@@ -0,0 +1,177 @@
+import os
+import json
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+from threadpoolctl import threadpool_limits
+from pages.utils.data_store import prune_files
+from pages.utils.model_cache import DISK_SIZE, MODEL_DIR, FittedARIMA, fingerprint, lookup, store
+from pages.utils.singleflight import flights
+
+# ARIMA order search: fits every (p, q) of a grid at a given d and picks the lowest AIC or BIC.
+# Candidates are fitted in waves across a process pool, fewest parameters first. Scores are cached
+# per ticker, series fingerprint and order next to the fitted models, and the winning fit is stored
+# in the model cache for the forecast path:
+#
+#   <STORE_DIR>/models/AAPL/<fingerprint>_scores.json
+#
+# With prune, candidates are skipped once their penalty minus twice an estimate of the best reachable
+# log-likelihood (a least-squares autoregression with as many lags as the grid's largest p + q) cannot
+# beat the best score so far. That estimate is not a bound on the exact ARIMA likelihood, since ARMA
+# models are not nested in a finite AR, so pruning is a heuristic that can skip the true minimizer; it
+# is off by default, and offered on the prediction page as an approximate option.
+
+P_VALUES = range(0, 6)
+Q_VALUES = range(0, 3)
+CRITERIA = ('aic', 'bic')
+
+
+def _scores_path(ticker, data):
+    return os.path.join(MODEL_DIR, (ticker or '_').upper().replace(os.sep, '_'), f'{fingerprint(data)}_scores.json')
+
+
+def _read_scores(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_scores(path, scores):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # merge with scores written meanwhile (e.g. by another session searching another grid)
+    merged = {**_read_scores(path), **scores}
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(merged, f)
+    os.replace(tmp, path)
+    prune_files(os.path.dirname(path), '_scores.json', DISK_SIZE)
+
+
+# Number of estimated parameters of an ARIMA(p, d, q) (statsmodels adds a constant only when d = 0)
+
+def parameter_count(order):
+    p, d, q = order
+    return p + q + 1 + (d == 0)
+
+
+def _penalty(order, criterion, nobs):
+    k = parameter_count(order)
+    return 2 * k if criterion == 'aic' else k * np.log(nobs)
+
+
+# Estimate of the best log-likelihood an ARIMA(p, d, q) with p + q up to `lags` can reach: the
+# Gaussian log-likelihood of a least-squares autoregression with `lags` lags on the differenced series.
+# A heuristic, not a bound: an MA term can fit better than any finite autoregression.
+
+def loglikelihood_bound(values, d, lags):
+    x = np.diff(values, d) if d else values - values.mean()
+    lags = max(1, min(lags, len(x) // 4))
+    X = np.column_stack([x[lags - j - 1:len(x) - j - 1] for j in range(lags)])
+    y = x[lags:]
+    beta = np.linalg.lstsq(X, y, rcond=None)[0]
+    sigma2 = np.mean((y - X @ beta) ** 2)
+    return -len(x) / 2 * (np.log(2 * np.pi * sigma2) + 1)
+
+
+def _score(values, order, threads):
+    with threadpool_limits(limits=threads):
+        try:
+            return FittedARIMA.from_results(ARIMA(values, order=order).fit())
+        except (ValueError, np.linalg.LinAlgError):
+            return None
+
+
+def _label(order):
+    return '-'.join(map(str, order))
+
+
+def _search(data, d, ticker, criterion, p_values, q_values, max_workers, prune):
+    values = np.asarray(data, dtype='float64').reshape(-1)
+    nobs = len(values) - d
+    path = _scores_path(ticker, data)
+    cached = _read_scores(path)
+    candidates = sorted(((p, d, q) for p in p_values for q in q_values), key=lambda o: (parameter_count(o), o))
+
+    rows, fits, fresh = {}, {}, {}
+    pending = []
+    for order in candidates:
+        if _label(order) in cached:
+            rows[order] = dict(cached[_label(order)], status='cached')
+            continue
+        fitted = lookup(ticker, data, order)
+        if fitted is not None:
+            fresh[_label(order)] = {'llf': fitted.llf, 'aic': fitted.aic, 'bic': fitted.bic}
+            rows[order] = dict(fresh[_label(order)], status='cached')
+        else:
+            pending.append(order)
+
+    def best():
+        scores = [r[criterion] for r in rows.values() if np.isfinite(r[criterion])]
+        return min(scores) if scores else np.inf
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(max_workers or cpus, len(pending)))
+    threads = max(1, cpus // workers)
+    bound = None
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while pending:
+            if prune and bound is None:
+                # more lags than the grid can use fit structure no candidate reaches (e.g. the page's
+                # 7-day smoothing), and the estimate gets too loose to ever prune
+                lags = max(p_values) + max(q_values)
+                bound = loglikelihood_bound(values, d, lags)
+            # the queue is in order of growing penalty: once one candidate is pruned, so is the rest
+            cut = len(pending)
+            if prune:
+                cut = next((i for i, o in enumerate(pending) if _penalty(o, criterion, nobs) - 2 * bound >= best()),
+                           len(pending))
+            for order in pending[cut:]:
+                rows[order] = {'llf': np.nan, 'aic': np.nan, 'bic': np.nan, 'status': 'pruned'}
+            wave, pending = pending[:min(cut, workers)], pending[min(cut, workers):cut]
+            if pool is None:
+                results = [_score(values, order, threads) for order in wave]
+            else:
+                results = list(pool.map(_score, [values] * len(wave), wave, [threads] * len(wave)))
+            for order, fitted in zip(wave, results):
+                if fitted is None:
+                    rows[order] = {'llf': np.nan, 'aic': np.nan, 'bic': np.nan, 'status': 'failed'}
+                    continue
+                fits[order] = fitted
+                fresh[_label(order)] = {'llf': fitted.llf, 'aic': fitted.aic, 'bic': fitted.bic}
+                rows[order] = dict(fresh[_label(order)], status='fitted')
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if fresh:
+        _write_scores(path, fresh)
+    scores = pd.DataFrame([{'p': o[0], 'd': o[1], 'q': o[2], **rows[o]} for o in candidates])
+    scores = scores.sort_values(criterion, na_position='last', ignore_index=True)
+    if scores[criterion].isna().all():
+        raise ValueError('no ARIMA order of the grid could be fitted')
+    order = tuple(int(scores.loc[0, c]) for c in ('p', 'd', 'q'))
+    if order in fits:
+        # the forecast path will ask for this fit next
+        store(ticker, data, order, fits[order])
+    return order, scores
+
+
+# Function to pick the (p, d, q) with the lowest AIC or BIC over a grid of p and q at differencing
+# order d. Returns the order and a frame with the llf, AIC and BIC of every candidate (NaN for
+# pruned and failed ones) and how it was obtained, best first.
+# With prune, candidates unlikely to beat the best score are skipped (a heuristic, see above).
+# Concurrent searches of the same series and grid share one search.
+
+def search_order(data, d, ticker=None, criterion='aic', p_values=P_VALUES, q_values=Q_VALUES, max_workers=None,
+                 prune=False):
+    if criterion not in CRITERIA:
+        raise ValueError(f'criterion must be one of {CRITERIA}')
+    p_values, q_values = tuple(p_values), tuple(q_values)
+    key = ('order', (ticker or '_').upper(), fingerprint(data), int(d), criterion, p_values, q_values, prune)
+    return flights.do(key, _search, data, int(d), ticker, criterion, p_values, q_values, max_workers, prune)
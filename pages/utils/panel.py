@@ -0,0 +1,152 @@
+import datetime
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pages.utils.data_store import FETCH_WORKERS, MAX_AGE, fetch_closes
+from pages.utils.providers import get_provider
+from pages.utils.singleflight import flights
+
+# Aligned price panel: the closes of a set of tickers and their benchmark on one shared trading
+# calendar, held as a single contiguous 2D block with a validity mask. A panel is built once per
+# (tickers, range) and cached; the CAPM functions (normalize, daily_returns, calculate_beta(s),
+# interactive_plot, ...) accept it in place of the merged Date/ticker frame and read straight from
+# the block. Blocks are read-only, so derived panels (returns, normalized prices) are cached on the
+# panel that produced them and shared as well.
+
+CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class PricePanel:
+
+    def __init__(self, dates, columns, values, benchmark=None):
+        values = np.ascontiguousarray(values)
+        values.flags.writeable = False
+        valid = ~np.isnan(values)
+        valid.flags.writeable = False
+        self.dates = pd.DatetimeIndex(dates, name='Date')
+        self.columns = list(columns)
+        self.values = values
+        self.valid = valid
+        self.benchmark = benchmark
+        self._positions = {name: i for i, name in enumerate(self.columns)}
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    # Function to build a panel from a frame with a Date column (or index) and one column per series
+    @classmethod
+    def from_frame(cls, df, benchmark=None, dtype='float64'):
+        if 'Date' in df.columns:
+            df = df.set_index('Date')
+        return cls(df.index, df.columns, df.to_numpy(dtype=dtype), benchmark)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    # Column as a Series indexed by date; a view of the block, not a copy
+    def __getitem__(self, name):
+        return pd.Series(self.values[:, self._positions[name]], index=self.dates, name=name, copy=False)
+
+    # Names of every column except the benchmark
+    @property
+    def stocks(self):
+        return [c for c in self.columns if c != self.benchmark]
+
+    def _stock_positions(self):
+        if self.benchmark not in self._positions:
+            return slice(None)
+        b = self._positions[self.benchmark]
+        if b == len(self.columns) - 1:
+            return slice(0, b)
+        return [i for i in range(len(self.columns)) if i != b]
+
+    # Block and validity mask of the stock columns; views when the benchmark is the last column
+    @property
+    def stock_values(self):
+        return self.values[:, self._stock_positions()]
+
+    @property
+    def stock_valid(self):
+        return self.valid[:, self._stock_positions()]
+
+    # Function to make a panel with the same dates and columns over another block
+    def with_values(self, values):
+        return PricePanel(self.dates, self.columns, values, self.benchmark)
+
+    # Function to compute something from this panel once; later calls with the same key share the result
+    def derived(self, key, fn):
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = fn()
+            return self._derived[key]
+
+    # Read-only frame view in the Date-column layout the pages display
+    def to_frame(self):
+        df = pd.DataFrame(self.values, columns=self.columns, copy=False)
+        df.insert(0, 'Date', self.dates)
+        return df
+
+    def head(self, n=5):
+        return self.to_frame().head(n)
+
+    def tail(self, n=5):
+        return self.to_frame().tail(n)
+
+
+# Function to load and align the closes of tickers (and a FRED benchmark, as the last column).
+# Rows are the benchmark's dates on which at least one ticker traded, the same rows an inner merge
+# of the downloads on Date gives; each close is scattered into the block by position.
+
+def build_price_panel(tickers, start=None, end=None, benchmark='sp500', dtype='float64',
+                      max_workers=FETCH_WORKERS, errors='raise'):
+    closes, bench = fetch_closes(tickers, start, end, benchmark, max_workers, errors)
+    if bench is not None:
+        calendar = pd.DatetimeIndex(bench.index)
+    elif closes:
+        calendar = pd.DatetimeIndex(sorted(set().union(*(c.index for c in closes.values()))))
+    else:
+        calendar = pd.DatetimeIndex([])
+
+    columns = list(closes) + ([benchmark] if bench is not None else [])
+    block = np.full((len(calendar), len(columns)), np.nan, dtype=dtype)
+    traded = np.zeros(len(calendar), dtype=bool)
+    for j, close in enumerate(closes.values()):
+        rows = calendar.get_indexer(close.index)
+        hit = rows >= 0
+        block[rows[hit], j] = close.to_numpy()[hit]
+        traded[rows[hit]] = True
+    if bench is not None:
+        block[:, -1] = bench.iloc[:, 0].to_numpy()
+
+    if not traded.all():
+        calendar, block = calendar[traded], block[traded]
+    return PricePanel(calendar, columns, block, benchmark if bench is not None else None)
+
+
+# Function to get the (cached) aligned panel for tickers over [start, end).
+# Panels older than max_age are rebuilt, which also brings the stored histories up to date.
+
+def get_price_panel(tickers, start=None, end=None, benchmark='sp500', dtype='float64', max_age=MAX_AGE, errors='raise'):
+    tickers = list(dict.fromkeys(tickers))
+    key = (get_provider().name, tuple(tickers),
+           pd.Timestamp(start) if start is not None else None, pd.Timestamp(end) if end is not None else None,
+           benchmark, np.dtype(dtype).str, errors)
+    now = datetime.datetime.now()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and now - entry[0] <= max_age:
+            _cache.move_to_end(key)
+            return entry[1]
+
+    panel = flights.do(('panel',) + key, build_price_panel, tickers, start, end, benchmark, dtype, errors=errors)
+    with _cache_lock:
+        _cache[key] = (now, panel)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return panel
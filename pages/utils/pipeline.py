@@ -0,0 +1,188 @@
+import sys
+import time
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+import pandas as pd
+from pages.utils.model import (ENGINES, evaluate_model, get_data, get_differencing_order, get_forecast,
+                               get_rolling_mean, inverse_scaling, scaling)
+from pages.utils.model_cache import fingerprint
+from pages.utils.order_search import search_order
+from pages.utils.singleflight import flights
+
+# Prediction pipeline as a DAG of named stages with content-addressed memoization:
+#
+#   fetch -> rolling -> d, scale -> order -> evaluate, forecast -> inverse
+#
+# A stage's key is a hash of its name and the keys of its inputs (stage outputs or run parameters);
+# a source stage (fetch) always runs and is keyed by the content of what it returns. So when the data
+# has not changed, every stage is a memo hit; when it has, or a parameter changes, only the stages
+# downstream of the change run. Each run records per-stage timings.
+#
+# Headless:  python -m pages.utils.pipeline AAPL MSFT --order aic --prune --engine fast
+
+CACHE_SIZE = 256
+ORDER_MODES = ('fixed', 'aic', 'bic')
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+class Stage:
+
+    def __init__(self, name, fn, inputs=(), source=False):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        # source stages read the outside world, so they run every time and are keyed by their output
+        self.source = source
+
+
+class PipelineRun:
+
+    def __init__(self, values, timings):
+        self.values = values
+        self.timings = timings
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+class Pipeline:
+
+    def __init__(self, stages, cache_size=CACHE_SIZE):
+        self.stages = OrderedDict()
+        for stage in stages:
+            # stages come in dependency order; any other input is a run parameter
+            self.stages[stage.name] = stage
+        self.cache_size = cache_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Names of the parameters a run needs
+    @property
+    def parameters(self):
+        return sorted({i for s in self.stages.values() for i in s.inputs if i not in self.stages})
+
+    def _needed(self, targets):
+        needed = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name in self.stages and name not in needed:
+                needed.add(name)
+                pending.extend(self.stages[name].inputs)
+        return needed
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memo[key] = value
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.cache_size:
+                self._memo.popitem(last=False)
+
+    def _compute(self, key, stage, args):
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key], True
+        value = stage.fn(*args)
+        self._remember(key, value)
+        return value, False
+
+    # Function to run the stages needed for `targets` (all of them when None) with the given parameters.
+    # Returns the stage outputs and a frame with each stage's time and whether it came from the memo.
+    def run(self, targets=None, **params):
+        missing = set(self.parameters) - set(params)
+        if missing:
+            raise TypeError(f'missing pipeline parameters: {sorted(missing)}')
+        needed = self._needed(targets or self.stages)
+        keys = {name: _digest(name, value) for name, value in params.items()}
+        values = dict(params)
+        timings = []
+        for name, stage in self.stages.items():
+            if name not in needed:
+                continue
+            args = [values[i] for i in stage.inputs]
+            t0 = time.perf_counter()
+            if stage.source:
+                value, cached = stage.fn(*args), False
+                keys[name] = _digest(name, fingerprint(value))
+            else:
+                keys[name] = _digest(name, *(keys[i] for i in stage.inputs))
+                value, cached = flights.do(('stage', keys[name]), self._compute, keys[name], stage, args)
+            values[name] = value
+            timings.append({'stage': name, 'seconds': time.perf_counter() - t0, 'cached': cached})
+        timings = pd.DataFrame(timings, columns=['stage', 'seconds', 'cached'])
+        return PipelineRun({name: values[name] for name in needed}, timings)
+
+
+def _differencing_order(rolling, ticker):
+    return get_differencing_order(rolling, ticker, reuse_lag=True)
+
+
+def _order(scale, d, ticker, order_mode, prune):
+    if order_mode == 'fixed':
+        return (30, d, 1), None
+    return search_order(scale[0], d, ticker, criterion=order_mode, prune=prune)
+
+
+def _evaluate(scale, d, order, ticker, engine):
+    return evaluate_model(scale[0], d, ticker, order[0], engine)
+
+
+def _forecast(scale, d, order, ticker, engine):
+    return get_forecast(scale[0], d, ticker, order[0], engine)
+
+
+def _inverse(forecast, scale):
+    forecast = forecast.copy()
+    forecast['Close'] = inverse_scaling(scale[1], forecast['Close'])
+    return forecast
+
+
+# The Stock Prediction page's pipeline. Parameters: ticker, order_mode ('fixed', 'aic' or 'bic'), prune
+# (skip search candidates unlikely to win; approximate, see order_search) and engine ('arima' or 'fast').
+# Stage outputs are shared by every session, so they must not be modified.
+PREDICTION = Pipeline([
+    Stage('fetch', get_data, ['ticker'], source=True),
+    Stage('rolling', get_rolling_mean, ['fetch']),
+    Stage('d', _differencing_order, ['rolling', 'ticker']),
+    Stage('scale', scaling, ['rolling']),
+    Stage('order', _order, ['scale', 'd', 'ticker', 'order_mode', 'prune']),
+    Stage('evaluate', _evaluate, ['scale', 'd', 'order', 'ticker', 'engine']),
+    Stage('forecast', _forecast, ['scale', 'd', 'order', 'ticker', 'engine']),
+    Stage('inverse', _inverse, ['forecast', 'scale']),
+])
+
+
+def run_prediction(ticker, order_mode='fixed', engine='arima', targets=None, prune=False):
+    return PREDICTION.run(targets, ticker=ticker.upper(), order_mode=order_mode, engine=engine,
+                          prune=bool(prune) and order_mode != 'fixed')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the prediction pipeline without the app')
+    parser.add_argument('tickers', nargs='+')
+    parser.add_argument('--order', choices=ORDER_MODES, default='fixed')
+    parser.add_argument('--prune', action='store_true',
+                        help='skip order-search candidates unlikely to win (approximate: may miss the best order)')
+    parser.add_argument('--engine', choices=ENGINES, default='arima')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per ticker; later runs show the memo hits')
+    args = parser.parse_args(argv)
+
+    for ticker in args.tickers:
+        for _ in range(args.repeat):
+            result = run_prediction(ticker, args.order, args.engine, prune=args.prune)
+            forecast = result['inverse']['Close']
+            print(f"{ticker.upper()}  {args.engine} {result['order'][0]}  RMSE {result['evaluate']}  "
+                  f"last {result['rolling'].iloc[-1]:.2f} -> {forecast.iloc[-1]:.2f} in {len(forecast)} days")
+            for row in result.timings.itertuples():
+                print(f"  {row.stage:<9} {row.seconds * 1000:>10.1f} ms{'  (memo)' if row.cached else ''}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+from pages.utils.panel import PricePanel
+
+# Portfolio construction over the stocks of a daily returns frame or panel (returns in percent, as
+# produced by capm_functions.daily_returns). Expected returns and volatilities are annualised, in percent.
+#
+#   simulate_portfolios      random long-only portfolios (Dirichlet weights), in bounded chunks
+#   min_variance_portfolio   analytic global minimum-variance portfolio
+#   max_sharpe_portfolio     analytic tangency portfolio
+#   efficient_frontier       analytic frontier through both
+#
+# The analytic portfolios only constrain the weights to sum to 1, so they may hold short positions.
+
+TRADING_DAYS = 252
+# Weight matrix elements per simulation chunk (8 MB of float64), whatever the number of stocks
+CHUNK_ELEMENTS = 2 ** 20
+
+
+# Function to get the stock names, annualised mean returns and annualised covariance matrix of the
+# stocks in a daily returns frame or panel. Only days on which every stock has a return are used.
+
+def annualized_moments(stocks_daily_return, benchmark='sp500'):
+    if isinstance(stocks_daily_return, PricePanel):
+        columns = [c for c in stocks_daily_return.stocks if c != benchmark]
+        returns = stocks_daily_return.values[:, [stocks_daily_return.columns.index(c) for c in columns]]
+    else:
+        columns = [c for c in stocks_daily_return.columns if c not in ('Date', benchmark)]
+        returns = stocks_daily_return[columns].to_numpy(dtype='float64')
+    # the first row of daily_returns is a placeholder 0, not a return
+    returns = returns[1:]
+    returns = returns[~np.isnan(returns).any(axis=1)]
+    mean = pd.Series(returns.mean(axis=0) * TRADING_DAYS, index=columns)
+    cov = pd.DataFrame(np.cov(returns, rowvar=False).reshape(len(columns), len(columns)) * TRADING_DAYS,
+                       index=columns, columns=columns)
+    return mean, cov
+
+
+# Function to get the annualised return, volatility and Sharpe ratio of a weight vector
+
+def portfolio_performance(weights, mean, cov, rf=0):
+    w = np.asarray(weights, dtype='float64')
+    ret = float(w @ np.asarray(mean))
+    vol = float(np.sqrt(w @ np.asarray(cov) @ w))
+    return ret, vol, (ret - rf) / vol
+
+
+def _solve(cov, b):
+    try:
+        return np.linalg.solve(cov, b)
+    except np.linalg.LinAlgError:
+        # singular covariance (e.g. duplicated columns): least-squares solution
+        return np.linalg.lstsq(cov, b, rcond=None)[0]
+
+
+def min_variance_portfolio(mean, cov):
+    w = _solve(np.asarray(cov), np.ones(len(mean)))
+    return pd.Series(w / w.sum(), index=mean.index)
+
+
+# Tangency portfolio; None when the minimum-variance portfolio does not beat rf, in which case the
+# fully invested portfolio with the highest Sharpe ratio does not exist
+
+def max_sharpe_portfolio(mean, cov, rf=0):
+    w = _solve(np.asarray(cov), np.asarray(mean) - rf)
+    if w.sum() <= 0:
+        return None
+    return pd.Series(w / w.sum(), index=mean.index)
+
+
+# Function to trace the analytic efficient frontier (the minimum volatility for each target return)
+# from the minimum-variance portfolio up to `reach` times the highest single-stock expected return
+
+def efficient_frontier(mean, cov, points=100, reach=1.5):
+    mu = np.asarray(mean, dtype='float64')
+    inv_one = _solve(np.asarray(cov), np.ones(len(mu)))
+    inv_mu = _solve(np.asarray(cov), mu)
+    a, b, c = inv_one.sum(), inv_one @ mu, mu @ inv_mu
+    d = a * c - b * b
+    top = max(mu.max() * reach, b / a)
+    target = np.linspace(b / a, top, points)
+    variance = (a * target ** 2 - 2 * b * target + c) / d if d > 0 else np.full(points, 1 / a)
+    return pd.DataFrame({'volatility': np.sqrt(np.maximum(variance, 0)), 'return': target})
+
+
+# Function to simulate random long-only portfolios. Weights are drawn from a flat Dirichlet
+# distribution in chunks of at most CHUNK_ELEMENTS weights; each chunk is scored with one matrix
+# product, and only the per-portfolio return, volatility and Sharpe ratio (plus the weights of the
+# best portfolios found) are kept, so 1M portfolios take 24 MB of results plus a few chunk buffers.
+
+def simulate_portfolios(mean, cov, portfolios=100_000, rf=0, seed=0, chunk_elements=CHUNK_ELEMENTS):
+    rng = np.random.default_rng(seed)
+    mu = np.asarray(mean, dtype='float64')
+    sigma = np.asarray(cov, dtype='float64')
+    size = max(1, chunk_elements // len(mu))
+
+    returns = np.empty(portfolios)
+    volatility = np.empty(portfolios)
+    best = {'max_sharpe': (-np.inf, None), 'min_volatility': (np.inf, None)}
+    for first in range(0, portfolios, size):
+        last = min(first + size, portfolios)
+        weights = rng.dirichlet(np.ones(len(mu)), size=last - first)
+        ret = weights @ mu
+        vol = np.sqrt(np.einsum('ij,ij->i', weights @ sigma, weights))
+        returns[first:last] = ret
+        volatility[first:last] = vol
+
+        sharpe = (ret - rf) / vol
+        i, j = sharpe.argmax(), vol.argmin()
+        if sharpe[i] > best['max_sharpe'][0]:
+            best['max_sharpe'] = (sharpe[i], weights[i].copy())
+        if vol[j] < best['min_volatility'][0]:
+            best['min_volatility'] = (vol[j], weights[j].copy())
+
+    return {
+        'returns': returns,
+        'volatility': volatility,
+        'sharpe': (returns - rf) / volatility,
+        'max_sharpe': pd.Series(best['max_sharpe'][1], index=mean.index),
+        'min_volatility': pd.Series(best['min_volatility'][1], index=mean.index),
+    }
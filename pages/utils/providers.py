@@ -0,0 +1,211 @@
+import os
+import json
+import zlib
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+import pandas_datareader as web
+
+# Market data providers. Every price, fundamentals and benchmark fetch in the app goes through
+# get_provider(), which is picked with the MARKET_DATA_PROVIDER environment variable:
+#
+#   yahoo            yfinance + FRED (default)
+#   synthetic        deterministic random walks, no network
+#   record:<dir>     yahoo, saving every response under <dir>
+#   replay:<dir>     serve the responses saved under <dir>, no network
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+# Start of a recorded series; FRED's reader would otherwise default to the last five years
+SERIES_START = '1900-01-01'
+
+
+# Function to bring a provider frame to the stored layout (tz-naive daily index named Date)
+
+def normalize_history(df):
+    df = df.reindex(columns=OHLCV_COLUMNS).astype('float64')
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df.index = index.normalize().rename('Date')
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def _slice(df, start=None, end=None):
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index <= pd.Timestamp(end)]
+    return df
+
+
+class MarketDataProvider:
+    name = 'base'
+
+    # Daily OHLCV bars from `start` onwards (the whole history when start is None)
+    def history(self, ticker, start=None):
+        raise NotImplementedError
+
+    # yf.Ticker(...).info style dict
+    def info(self, ticker):
+        raise NotImplementedError
+
+    # Single-column frame of a FRED series such as 'sp500', indexed by Date
+    def series(self, name, start=None, end=None):
+        raise NotImplementedError
+
+
+class YahooProvider(MarketDataProvider):
+    name = 'yahoo'
+
+    def __init__(self):
+        # yfinance already shares one session across threads; FRED requests get their own
+        self.fred_session = requests.Session()
+
+    def history(self, ticker, start=None):
+        if start is None:
+            df = yf.Ticker(ticker).history(period='max', auto_adjust=True)
+        else:
+            df = yf.Ticker(ticker).history(start=pd.Timestamp(start).strftime('%Y-%m-%d'), auto_adjust=True)
+        return normalize_history(df)
+
+    def info(self, ticker):
+        return yf.Ticker(ticker).info
+
+    def series(self, name, start=None, end=None):
+        df = web.DataReader([name], 'fred', start, end, session=self.fred_session)
+        df.index = pd.DatetimeIndex(df.index).rename('Date')
+        return df
+
+
+# Serves responses captured on disk. With an upstream provider, anything missing is fetched from it
+# and saved first (record mode); without one, a missing capture raises LookupError.
+#
+#   <directory>/history/AAPL.parquet
+#   <directory>/info/AAPL.json
+#   <directory>/series/sp500.parquet
+
+class ReplayProvider(MarketDataProvider):
+
+    def __init__(self, directory, upstream=None):
+        self.directory = directory
+        self.upstream = upstream
+        self.name = ('record-' if upstream is not None else 'replay-') + os.path.basename(os.path.normpath(directory))
+
+    def _path(self, kind, key, ext):
+        return os.path.join(self.directory, kind, key.upper().replace(os.sep, '_') + ext)
+
+    def _missing(self, path):
+        if self.upstream is None:
+            raise LookupError(f'No recorded response at {path}')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def history(self, ticker, start=None):
+        path = self._path('history', ticker, '.parquet')
+        if not os.path.exists(path):
+            self._missing(path)
+            self.upstream.history(ticker).to_parquet(path)
+        return _slice(pd.read_parquet(path), start)
+
+    def info(self, ticker):
+        path = self._path('info', ticker, '.json')
+        if not os.path.exists(path):
+            self._missing(path)
+            with open(path, 'w') as f:
+                json.dump(self.upstream.info(ticker), f, default=str)
+        with open(path) as f:
+            return json.load(f)
+
+    def series(self, name, start=None, end=None):
+        path = self._path('series', name, '.parquet')
+        if not os.path.exists(path):
+            self._missing(path)
+            # record the whole series so replays of any window are served from it
+            self.upstream.series(name, SERIES_START, None).to_parquet(path)
+        return _slice(pd.read_parquet(path), start, end)
+
+
+# Deterministic geometric random walks for any ticker. Every ticker loads on one shared market
+# factor (also served as the 'sp500' series) with its own beta, so CAPM results are meaningful.
+
+class SyntheticProvider(MarketDataProvider):
+
+    def __init__(self, length=2520, end='2026-01-02', seed=0):
+        self.length = length
+        self.end = pd.Timestamp(end)
+        self.seed = seed
+        self.name = f'synthetic-{seed}'
+        self.dates = pd.bdate_range(end=self.end, periods=length, name='Date')
+        market = np.random.default_rng(seed)
+        self.market_returns = market.normal(0.0003, 0.011, length)
+
+    def _rng(self, key):
+        return np.random.default_rng([self.seed, zlib.crc32(key.upper().encode())])
+
+    def history(self, ticker, start=None):
+        rng = self._rng(ticker)
+        beta = rng.uniform(0.5, 2.0)
+        returns = beta * self.market_returns + rng.normal(0.0001, 0.015, self.length)
+        close = rng.uniform(20, 500) * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[close[0]], close[:-1]]) * (1 + rng.normal(0, 0.003, self.length))
+        spread = np.abs(rng.normal(0, 0.008, (2, self.length)))
+        df = pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + spread[0]),
+            'Low': np.minimum(open_, close) * (1 - spread[1]),
+            'Close': close,
+            'Volume': np.round(rng.lognormal(15, 0.5, self.length)),
+            'Dividends': 0.0,
+            'Stock Splits': 0.0,
+        }, index=self.dates)
+        return _slice(df, start)
+
+    def info(self, ticker):
+        rng = self._rng(ticker)
+        close = self.history(ticker)['Close']
+        return {
+            'longBusinessSummary': f'{ticker.upper()} is a synthetic company generated for offline testing.',
+            'sector': 'Synthetic', 'industry': 'Random Walk', 'website': 'https://example.com',
+            'marketCap': float(close.iloc[-1] * rng.uniform(1e8, 1e10)),
+            'previousClose': float(close.iloc[-2]), 'open': float(close.iloc[-1]),
+            'dayHigh': float(close.iloc[-1]), 'fiftyTwoWeekHigh': float(close.iloc[-252:].max()),
+            'volume': float(rng.lognormal(15, 0.5)), 'beta': float(rng.uniform(0.5, 2.0)),
+            'dividendYield': 0.0, 'trailingPE': float(rng.uniform(5, 60)), 'forwardPE': float(rng.uniform(5, 60)),
+            'trailingEps': float(rng.uniform(0.1, 10)), 'forwardEps': float(rng.uniform(0.1, 10)),
+            'priceToSalesTrailing12Months': float(rng.uniform(0.5, 20)), 'priceToBook': float(rng.uniform(0.5, 20)),
+            'currentRatio': float(rng.uniform(0.5, 3)), 'debtToEquity': float(rng.uniform(0, 200)),
+        }
+
+    def series(self, name, start=None, end=None):
+        level = 1000 * np.exp(np.cumsum(self.market_returns))
+        return _slice(pd.DataFrame({name: level}, index=self.dates), start, end)
+
+
+# Function to build a provider from a MARKET_DATA_PROVIDER style spec
+
+def make_provider(spec):
+    kind, _, arg = spec.partition(':')
+    if kind == 'yahoo':
+        return YahooProvider()
+    if kind == 'synthetic':
+        return SyntheticProvider(seed=int(arg) if arg else 0)
+    if kind == 'replay':
+        return ReplayProvider(arg)
+    if kind == 'record':
+        return ReplayProvider(arg, upstream=YahooProvider())
+    raise ValueError(f'Unknown market data provider: {spec}')
+
+
+_provider = None
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = make_provider(os.environ.get('MARKET_DATA_PROVIDER', 'yahoo'))
+    return _provider
+
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
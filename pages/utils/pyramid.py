@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pages.utils.providers import get_provider
+
+# Multi-resolution OHLCV pyramid: the daily bars of a ticker aggregated to weekly, monthly and
+# quarterly bars. Charts pick the coarsest level that still has enough bars in the requested period
+# to fill the chart width, so a multi-year view draws a few hundred candles instead of thousands.
+# Coarse bars are dated by their first trading day.
+
+RESOLUTIONS = (('Daily', None), ('Weekly', 'W-FRI'), ('Monthly', 'M'), ('Quarterly', 'Q'))
+# Width of the plotting area in pixels, and the widest a single bar should be drawn
+CHART_WIDTH = 1200
+MAX_BAR_WIDTH = 8
+CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# Function to aggregate daily OHLCV bars by calendar period; returns the bars and the position of
+# each bucket's first daily bar
+
+def aggregate_ohlcv(daily, freq):
+    if len(daily) == 0:
+        return daily[['Open', 'High', 'Low', 'Close', 'Volume']], np.array([], dtype=np.int64)
+    ordinals = daily.index.to_period(freq).asi8
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(ordinals)) + 1])
+    ends = np.append(starts[1:], len(daily)) - 1
+    bars = pd.DataFrame({
+        'Open': daily['Open'].to_numpy()[starts],
+        'High': np.fmax.reduceat(daily['High'].to_numpy(), starts),
+        'Low': np.fmin.reduceat(daily['Low'].to_numpy(), starts),
+        'Close': daily['Close'].to_numpy()[ends],
+        'Volume': np.add.reduceat(np.nan_to_num(daily['Volume'].to_numpy()), starts),
+    }, index=daily.index[starts])
+    return bars, starts
+
+
+class Pyramid:
+
+    def __init__(self, daily):
+        self._build(daily)
+
+    def _build(self, daily):
+        self.daily = daily
+        self.levels = {'Daily': daily}
+        self.starts = {}
+        for name, freq in RESOLUTIONS[1:]:
+            self.levels[name], self.starts[name] = aggregate_ohlcv(daily, freq)
+
+    # Function to bring the pyramid up to date with a newer daily frame. When the new frame only adds
+    # bars (or revises the last one), just the last bucket of each level onwards is re-aggregated.
+    def update(self, daily):
+        old = self.daily
+        n = len(old)
+        if len(daily) == n and daily.index[-1] == old.index[-1] and daily['Close'].iloc[-1] == old['Close'].iloc[-1]:
+            return self
+        if (n < 2 or len(daily) < n or daily.index[0] != old.index[0] or daily.index[n - 2] != old.index[n - 2]
+                or daily['Close'].iloc[n - 2] != old['Close'].iloc[n - 2]):
+            self._build(daily)
+            return self
+
+        self.daily = daily
+        self.levels['Daily'] = daily
+        for name, freq in RESOLUTIONS[1:]:
+            first = self.starts[name][-1]
+            bars, starts = aggregate_ohlcv(daily.iloc[first:], freq)
+            self.levels[name] = pd.concat([self.levels[name].iloc[:-1], bars])
+            self.starts[name] = np.concatenate([self.starts[name][:-1], starts + first])
+        return self
+
+    # Function to get the bars after `since` (all of them when None) at the coarsest resolution that
+    # still fills the chart. Returns the bars and the name of the resolution used.
+    def select(self, since=None, chart_width=CHART_WIDTH, max_bar_width=MAX_BAR_WIDTH):
+        needed = chart_width / max_bar_width
+        for name, _ in reversed(RESOLUTIONS):
+            bars = self.levels[name]
+            lo = 0 if since is None else bars.index.searchsorted(since, side='right')
+            if len(bars) - lo >= needed or name == 'Daily':
+                return bars.iloc[lo:], name
+
+
+# Function to get the (cached, incrementally updated) pyramid for a ticker's daily bars.
+# Pyramids are kept per provider, so bars from different providers are never mixed.
+
+def get_pyramid(ticker, daily):
+    key = (get_provider().name, ticker.upper())
+    with _cache_lock:
+        pyramid = _cache.get(key)
+        if pyramid is not None:
+            _cache.move_to_end(key)
+            return pyramid.update(daily)
+    pyramid = Pyramid(daily)
+    with _cache_lock:
+        _cache[key] = pyramid
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return pyramid
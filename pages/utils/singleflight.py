@@ -0,0 +1,63 @@
+import threading
+
+# In-process request coalescing. Streamlit runs every session in its own thread of one process,
+# so when several sessions ask for the same thing at once (same ticker, range, model config)
+# only the first one does the work and the rest wait for its result.
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.collapsed = 0
+
+    # Function to run fn(*args, **kwargs) unless a call with the same key is already running,
+    # in which case wait for it and return (or raise) its outcome
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {'executed': self.executed, 'collapsed': self.collapsed, 'in_flight': len(self._calls)}
+
+
+# Shared by the data store, the fundamentals cache and the forecasting model
+flights = SingleFlight()
+
+
+def stats():
+    return flights.stats()
@@ -0,0 +1,161 @@
+import math
+import numpy as np
+
+# Streaming indicators: each object holds a small running state and updates in constant time per
+# appended bar, giving the same values as the batch engine in pages.utils.indicators (and pandas_ta).
+# state() returns a JSON-serialisable dict and from_state() rebuilds the object from it.
+
+NAN = float('nan')
+
+
+class StreamingSMA:
+
+    def __init__(self, length):
+        self.length = length
+        self.window = np.full(length, np.nan)
+        self.pos = 0
+        self.count = 0
+        self.total = 0.0
+
+    @property
+    def value(self):
+        return self.total / self.length if self.count >= self.length else NAN
+
+    def update(self, x):
+        old = self.window[self.pos]
+        self.window[self.pos] = x
+        self.pos = (self.pos + 1) % self.length
+        self.count += 1
+        self.total += x if math.isnan(old) else x - old
+        if self.pos == 0:
+            # re-anchor the running sum once per lap so rounding errors cannot build up
+            self.total = math.fsum(self.window[~np.isnan(self.window)])
+        return self.value
+
+    def state(self):
+        return {'kind': 'SMA', 'length': self.length, 'count': self.count,
+                'window': np.roll(self.window, -self.pos).tolist()}
+
+    @classmethod
+    def from_state(cls, state):
+        sma = cls(state['length'])
+        sma.window = np.array(state['window'], dtype='float64')
+        sma.count = state['count']
+        sma.total = math.fsum(sma.window[~np.isnan(sma.window)])
+        return sma
+
+
+# pandas_ta style EMA: the first `length` values are averaged into the seed, then y = (1 - a) * y + a * x
+
+class StreamingEMA:
+
+    def __init__(self, length):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.count = 0
+        self.seed_total = 0.0
+        self.value = NAN
+
+    def update(self, x):
+        self.count += 1
+        if self.count < self.length:
+            self.seed_total += x
+        elif self.count == self.length:
+            self.seed_total += x
+            self.value = self.seed_total / self.length
+        else:
+            self.value = self.value * (1 - self.alpha) + x * self.alpha
+        return self.value
+
+    def state(self):
+        return {'kind': 'EMA', 'length': self.length, 'count': self.count,
+                'seed_total': self.seed_total, 'value': self.value}
+
+    @classmethod
+    def from_state(cls, state):
+        ema = cls(state['length'])
+        ema.count = state['count']
+        ema.seed_total = state['seed_total']
+        ema.value = state['value']
+        return ema
+
+
+# RSI on Wilder-style averages of gains and losses (alpha = 1 / length). The averages are kept as
+# the numerators of pandas' adjusted exponential mean; its shared denominator cancels out of the RSI.
+
+class StreamingRSI:
+
+    def __init__(self, length=14):
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.prev = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+
+    @property
+    def value(self):
+        if self.count < self.length:
+            return NAN
+        return 100 * self.gain / (self.gain + self.loss)
+
+    def update(self, x):
+        if self.prev is not None:
+            change = x - self.prev
+            self.gain = max(change, 0.0) + self.decay * self.gain
+            self.loss = max(-change, 0.0) + self.decay * self.loss
+            self.count += 1
+        self.prev = x
+        return self.value
+
+    def state(self):
+        return {'kind': 'RSI', 'length': self.length, 'count': self.count, 'prev': self.prev,
+                'gain': self.gain, 'loss': self.loss}
+
+    @classmethod
+    def from_state(cls, state):
+        rsi = cls(state['length'])
+        rsi.count = state['count']
+        rsi.prev = state['prev']
+        rsi.gain = state['gain']
+        rsi.loss = state['loss']
+        return rsi
+
+
+# MACD line, histogram and signal (in pandas_ta column order); the signal EMA starts at the first valid MACD value
+
+class StreamingMACD:
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+        self.value = (NAN, NAN, NAN)
+
+    def update(self, x):
+        macd = self.fast.update(x) - self.slow.update(x)
+        if math.isnan(macd):
+            return self.value
+        signal = self.signal.update(macd)
+        self.value = (macd, macd - signal, signal)
+        return self.value
+
+    def state(self):
+        return {'kind': 'MACD', 'fast': self.fast.state(), 'slow': self.slow.state(),
+                'signal': self.signal.state(), 'value': list(self.value)}
+
+    @classmethod
+    def from_state(cls, state):
+        macd = cls.__new__(cls)
+        macd.fast = StreamingEMA.from_state(state['fast'])
+        macd.slow = StreamingEMA.from_state(state['slow'])
+        macd.signal = StreamingEMA.from_state(state['signal'])
+        macd.value = tuple(state['value'])
+        return macd
+
+
+STREAMING_CLASSES = {'SMA': StreamingSMA, 'EMA': StreamingEMA, 'RSI': StreamingRSI, 'MACD': StreamingMACD}
+
+
+def from_state(state):
+    return STREAMING_CLASSES[state['kind']].from_state(state)
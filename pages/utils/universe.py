@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pandas as pd
+from pages.utils.capm_functions import regression_stats, returns_matrix
+from pages.utils.data_store import MAX_AGE
+from pages.utils.panel import get_price_panel
+
+# Universe-scale CAPM: betas and expected returns for every constituent of an index at once.
+# The constituent list is a local CSV with a Symbol (or Ticker) column, or a plain file with one
+# symbol per line. STOCK_UNIVERSE_FILE sets the file the CAPM page offers by default.
+
+UNIVERSE_FILE = os.environ.get('STOCK_UNIVERSE_FILE', '')
+SYMBOL_COLUMNS = ('symbol', 'ticker')
+TRADING_DAYS = 252
+# Stocks with fewer daily returns than this in the period get no estimates
+MIN_OBSERVATIONS = 60
+# Columns regressed per pass; bounds the temporaries of regression_stats to a few rows x 512 columns
+CHUNK_COLUMNS = 512
+
+
+# Function to read a constituent list; symbols are upper-cased, de-duplicated and given Yahoo's
+# share class notation (BRK.B -> BRK-B)
+
+def load_constituents(path):
+    table = pd.read_csv(path, dtype=str, comment='#', skipinitialspace=True, keep_default_na=False)
+    column = next((c for c in table.columns if c.strip().lower() in SYMBOL_COLUMNS), None)
+    if column is not None:
+        symbols = table[column]
+    else:
+        # no header: the first line is a symbol as well
+        symbols = pd.concat([pd.Series([table.columns[0]]), table.iloc[:, 0]])
+    symbols = symbols.str.strip().str.upper().str.replace('.', '-', regex=False)
+    symbols = symbols[symbols != '']
+    return list(dict.fromkeys(symbols))
+
+
+# Function to load the aligned closes of a whole universe; tickers that cannot be loaded are skipped.
+# Returns the (cached) PricePanel of the loaded tickers plus the benchmark, and the skipped tickers.
+
+def load_universe_panel(tickers, start=None, end=None, benchmark='sp500', max_age=MAX_AGE):
+    panel = get_price_panel(tickers, start, end, benchmark=benchmark, max_age=max_age, errors='skip')
+    return panel, [t for t in tickers if t not in panel]
+
+
+# Daily returns (in percent); a return is NaN unless both its day and the day before have a price,
+# so a stock's first day, trading halts and multi-day gaps drop out of the regression
+
+def _returns(prices):
+    returns = returns_matrix(prices)
+    returns[0] = np.nan
+    return returns
+
+
+# Function to get the annualised mean daily return (in percent) of the benchmark over the panel's dates
+
+def market_return(panel):
+    return np.nanmean(_returns(panel[panel.benchmark].to_numpy()[:, None])) * TRADING_DAYS
+
+
+def _chunk_stats(market, returns, columns):
+    stats = regression_stats(market, returns, columns)
+    count = (~np.isnan(returns)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(returns, axis=0) / count
+        std = np.sqrt(np.nansum((returns - mean) ** 2, axis=0) / (count - 1))
+    stats['annual_return'] = mean * TRADING_DAYS
+    stats['annual_volatility'] = std * np.sqrt(TRADING_DAYS)
+    return stats
+
+
+# Function to run CAPM over every stock of a PricePanel.
+# Returns one row per stock with the regression statistics of regression_stats plus annualised
+# return, volatility and CAPM expected return (in percent). Names listed part-way through the period
+# are estimated on the dates they traded.
+# Columns are read as a view of the panel block and processed in chunks, so peak memory stays at
+# about twice the price block.
+
+def universe_capm(panel, rf=0, min_observations=MIN_OBSERVATIONS):
+    columns = panel.stocks
+    returns = _returns(panel.stock_values)
+    market = _returns(panel[panel.benchmark].to_numpy()[:, None])[:, 0]
+    rm = market_return(panel)
+
+    stats = pd.concat([
+        _chunk_stats(market, returns[:, i:i + CHUNK_COLUMNS], columns[i:i + CHUNK_COLUMNS])
+        for i in range(0, max(len(columns), 1), CHUNK_COLUMNS)
+    ])
+    stats['expected_return'] = rf + stats['beta'] * (rm - rf)
+    stats.loc[stats['observations'] < min_observations, stats.columns != 'observations'] = np.nan
+    return stats